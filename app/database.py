@@ -5,8 +5,9 @@ Uses SQLite with aiosqlite for async operations.
 
 import json
 import aiosqlite
+from datetime import datetime, timezone
 from pathlib import Path
-from typing import Optional, Any
+from typing import Optional, Any, Iterable
 from contextlib import asynccontextmanager
 
 # Database path
@@ -16,11 +17,21 @@ DB_PATH = DATA_DIR / "pad_annotations.db"
 MIGRATIONS_DIR = BASE_DIR / "migrations"
 
 
+# Per-connection settings, applied in one round trip. journal_mode=WAL is
+# persistent in the database file, so init_db() sets it once instead.
+CONNECTION_PRAGMAS = """
+    PRAGMA foreign_keys = ON;
+    PRAGMA synchronous = NORMAL;
+    PRAGMA temp_store = MEMORY;
+    PRAGMA mmap_size = 268435456;
+"""
+
+
 async def get_db() -> aiosqlite.Connection:
     """Get a database connection."""
     db = await aiosqlite.connect(DB_PATH)
     db.row_factory = aiosqlite.Row
-    await db.execute("PRAGMA foreign_keys = ON")
+    await db.executescript(CONNECTION_PRAGMAS)
     return db
 
 
@@ -39,6 +50,9 @@ async def init_db():
     DATA_DIR.mkdir(exist_ok=True)
 
     async with get_db_context() as db:
+        # WAL lets readers proceed during writes and makes commits cheaper
+        await db.execute("PRAGMA journal_mode = WAL")
+
         # Check which migrations have been applied
         try:
             cursor = await db.execute(
@@ -85,7 +99,22 @@ def json_loads(data: str) -> Any:
     return json.loads(data) if data else None
 
 
+def utc_now() -> str:
+    """Current UTC time in SQLite's datetime('now') format."""
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+
 # User operations
+def _user_row_to_dict(row: Optional[aiosqlite.Row]) -> Optional[dict]:
+    """Convert a users Row to a dictionary, parsing its specializations JSON."""
+    if row is None:
+        return None
+    user = dict(row)
+    if user.get('specializations'):
+        user['specializations'] = json_loads(user['specializations'])
+    return user
+
+
 async def create_user(
     db: aiosqlite.Connection,
     email: str,
@@ -118,8 +147,7 @@ async def get_user_by_email(db: aiosqlite.Connection, email: str) -> Optional[di
         "SELECT * FROM users WHERE email = ? AND is_active = 1",
         (email,)
     )
-    row = await cursor.fetchone()
-    return await row_to_dict(row) if row else None
+    return _user_row_to_dict(await cursor.fetchone())
 
 
 async def get_user_by_id(db: aiosqlite.Connection, user_id: int) -> Optional[dict]:
@@ -128,8 +156,7 @@ async def get_user_by_id(db: aiosqlite.Connection, user_id: int) -> Optional[dic
         "SELECT * FROM users WHERE id = ? AND is_active = 1",
         (user_id,)
     )
-    row = await cursor.fetchone()
-    return await row_to_dict(row) if row else None
+    return _user_row_to_dict(await cursor.fetchone())
 
 
 async def get_specialists(db: aiosqlite.Connection) -> list[dict]:
@@ -142,13 +169,7 @@ async def get_specialists(db: aiosqlite.Connection) -> list[dict]:
         ORDER BY u.name
         """
     )
-    rows = await cursor.fetchall()
-    users = await rows_to_dicts(rows)
-    # Parse specializations JSON for each user
-    for user in users:
-        if user.get('specializations'):
-            user['specializations'] = json_loads(user['specializations'])
-    return users
+    return [_user_row_to_dict(row) for row in await cursor.fetchall()]
 
 
 async def get_all_users(db: aiosqlite.Connection, include_inactive: bool = False) -> list[dict]:
@@ -157,13 +178,7 @@ async def get_all_users(db: aiosqlite.Connection, include_inactive: bool = False
         cursor = await db.execute("SELECT * FROM users ORDER BY name")
     else:
         cursor = await db.execute("SELECT * FROM users WHERE is_active = 1 ORDER BY name")
-    rows = await cursor.fetchall()
-    users = await rows_to_dicts(rows)
-    # Parse specializations JSON for each user
-    for user in users:
-        if user.get('specializations'):
-            user['specializations'] = json_loads(user['specializations'])
-    return users
+    return [_user_row_to_dict(row) for row in await cursor.fetchall()]
 
 
 async def update_user(
@@ -179,59 +194,46 @@ async def update_user(
     institution: Optional[str] = None,
     specializations: Optional[list] = None,
     is_active: Optional[bool] = None
-) -> bool:
-    """Update a user. Returns True if user was found and updated."""
-    updates = []
-    params = []
-
-    if email is not None:
-        updates.append("email = ?")
-        params.append(email)
-    if name is not None:
-        updates.append("name = ?")
-        params.append(name)
-    if password_hash is not None:
-        updates.append("password_hash = ?")
-        params.append(password_hash)
-    if role is not None:
-        updates.append("role = ?")
-        params.append(role)
-    if expertise_level is not None:
-        updates.append("expertise_level = ?")
-        params.append(expertise_level)
-    if years_experience is not None:
-        updates.append("years_experience = ?")
-        params.append(years_experience)
-    if training_date is not None:
-        updates.append("training_date = ?")
-        params.append(training_date)
-    if institution is not None:
-        updates.append("institution = ?")
-        params.append(institution)
-    if specializations is not None:
-        updates.append("specializations = ?")
-        params.append(json_dumps(specializations))
-    if is_active is not None:
-        updates.append("is_active = ?")
-        params.append(1 if is_active else 0)
-
-    if not updates:
-        return False
+) -> Optional[dict]:
+    """
+    Update a user in a single statement.
 
-    updates.append("updated_at = datetime('now')")
-    params.append(user_id)
+    Only the non-None fields are written. Returns the updated user row, or
+    None if nothing was changed or the user does not exist.
+    """
+    candidate = {
+        "email": email,
+        "name": name,
+        "password_hash": password_hash,
+        "role": role,
+        "expertise_level": expertise_level,
+        "years_experience": years_experience,
+        "training_date": training_date,
+        "institution": institution,
+        "specializations": json_dumps(specializations),
+        "is_active": None if is_active is None else int(is_active),
+    }
+    fields = {k: v for k, v in candidate.items() if v is not None}
+
+    if not fields:
+        return None
 
-    query = f"UPDATE users SET {', '.join(updates)} WHERE id = ?"
-    cursor = await db.execute(query, params)
+    assignments = ", ".join(f"{column} = ?" for column in fields)
+    cursor = await db.execute(
+        f"UPDATE users SET {assignments}, updated_at = ? WHERE id = ? RETURNING *",
+        (*fields.values(), utc_now(), user_id)
+    )
+    row = await cursor.fetchone()
+    await cursor.close()
     await db.commit()
-    return cursor.rowcount > 0
+    return _user_row_to_dict(row)
 
 
 async def deactivate_user(db: aiosqlite.Connection, user_id: int) -> bool:
     """Soft delete a user by setting is_active to 0."""
     cursor = await db.execute(
-        "UPDATE users SET is_active = 0, updated_at = datetime('now') WHERE id = ?",
-        (user_id,)
+        "UPDATE users SET is_active = 0, updated_at = ? WHERE id = ?",
+        (utc_now(), user_id)
     )
     await db.commit()
     return cursor.rowcount > 0
@@ -243,13 +245,30 @@ async def get_user_by_id_include_inactive(db: aiosqlite.Connection, user_id: int
         "SELECT * FROM users WHERE id = ?",
         (user_id,)
     )
-    row = await cursor.fetchone()
-    if row:
-        user = await row_to_dict(row)
-        if user.get('specializations'):
-            user['specializations'] = json_loads(user['specializations'])
-        return user
-    return None
+    return _user_row_to_dict(await cursor.fetchone())
+
+
+async def get_user_with_email_conflict(
+    db: aiosqlite.Connection,
+    user_id: int,
+    email: Optional[str]
+) -> Optional[dict]:
+    """
+    Get a user by ID (including inactive) in the same query as a duplicate-email check.
+
+    The returned dict carries an extra `email_conflict` flag that is true when
+    another user (active or not) already uses `email`.
+    """
+    cursor = await db.execute(
+        """
+        SELECT u.*,
+               EXISTS(SELECT 1 FROM users WHERE email = ? AND id <> u.id) AS email_conflict
+        FROM users u
+        WHERE u.id = ?
+        """,
+        (email, user_id)
+    )
+    return _user_row_to_dict(await cursor.fetchone())
 
 
 # User role operations
@@ -270,6 +289,8 @@ async def add_user_role(db: aiosqlite.Connection, user_id: int, role: str) -> bo
             "INSERT INTO user_roles (user_id, role) VALUES (?, ?)",
             (user_id, role)
         )
+        # Bump updated_at so tokens issued before this change stop trusting their roles claim
+        await db.execute("UPDATE users SET updated_at = ? WHERE id = ?", (utc_now(), user_id))
         await db.commit()
         return True
     except aiosqlite.IntegrityError:
@@ -283,8 +304,11 @@ async def remove_user_role(db: aiosqlite.Connection, user_id: int, role: str) ->
         "DELETE FROM user_roles WHERE user_id = ? AND role = ?",
         (user_id, role)
     )
+    removed = cursor.rowcount > 0
+    if removed:
+        await db.execute("UPDATE users SET updated_at = ? WHERE id = ?", (utc_now(), user_id))
     await db.commit()
-    return cursor.rowcount > 0
+    return removed
 
 
 async def user_has_role(db: aiosqlite.Connection, user_id: int, role: str) -> bool:
@@ -297,8 +321,8 @@ async def user_has_role(db: aiosqlite.Connection, user_id: int, role: str) -> bo
     return row is not None
 
 
-async def set_user_roles(db: aiosqlite.Connection, user_id: int, roles: list[str]) -> None:
-    """Set all roles for a user (replaces existing roles)."""
+async def set_user_roles(db: aiosqlite.Connection, user_id: int, roles: list[str]) -> str:
+    """Set all roles for a user (replaces existing roles). Returns the legacy role written to users."""
     # Remove all existing roles
     await db.execute("DELETE FROM user_roles WHERE user_id = ?", (user_id,))
 
@@ -316,11 +340,35 @@ async def set_user_roles(db: aiosqlite.Connection, user_id: int, roles: list[str
     else:
         legacy_role = 'specialist'
     await db.execute(
-        "UPDATE users SET role = ?, updated_at = datetime('now') WHERE id = ?",
-        (legacy_role, user_id)
+        "UPDATE users SET role = ?, updated_at = ? WHERE id = ?",
+        (legacy_role, utc_now(), user_id)
     )
 
     await db.commit()
+    return legacy_role
+
+
+# Collections whose admin lists are served with ETags. Each has a counter in
+# collection_versions that triggers bump on every insert, update or delete.
+VERSIONED_COLLECTIONS = frozenset({"samples", "studies", "specialists"})
+
+
+async def get_collection_version(db: aiosqlite.Connection, collection: str) -> str:
+    """
+    Get a cheap fingerprint of a collection from its change counter.
+
+    The counter is bumped by triggers on every write (see migration 009), so
+    the value changes on each edit without reading the rows themselves, even
+    when several edits land within the same second.
+    """
+    if collection not in VERSIONED_COLLECTIONS:
+        raise KeyError(collection)
+    cursor = await db.execute(
+        "SELECT version FROM collection_versions WHERE collection = ?",
+        (collection,)
+    )
+    row = await cursor.fetchone()
+    return str(row[0] if row else 0)
 
 
 # Sample operations
@@ -411,8 +459,8 @@ async def update_study_status(
 ):
     """Update study status."""
     await db.execute(
-        "UPDATE studies SET status = ?, updated_at = datetime('now') WHERE id = ?",
-        (status, study_id)
+        "UPDATE studies SET status = ?, updated_at = ? WHERE id = ?",
+        (status, utc_now(), study_id)
     )
     await db.commit()
 
@@ -450,6 +498,50 @@ async def get_study_samples(db: aiosqlite.Connection, study_id: int) -> list[dic
     return await rows_to_dicts(rows)
 
 
+async def get_study_with_samples(db: aiosqlite.Connection, study_id: int) -> Optional[dict]:
+    """
+    Get a study and its ordered samples in a single query.
+
+    The samples are aggregated in SQL with json_group_array and returned
+    under the "samples" key alongside the study columns.
+    """
+    cursor = await db.execute(
+        """
+        SELECT st.*,
+               (
+                   SELECT json_group_array(json_object(
+                       'study_sample_id', ordered.study_sample_id,
+                       'display_order', ordered.display_order,
+                       'id', ordered.id,
+                       'drug_name', ordered.drug_name,
+                       'drug_name_display', ordered.drug_name_display,
+                       'card_id', ordered.card_id,
+                       'filename', ordered.filename,
+                       'image_path', ordered.image_path
+                   ))
+                   FROM (
+                       SELECT es.id AS study_sample_id, es.display_order, s.id, s.drug_name,
+                              s.drug_name_display, s.card_id, s.filename, s.image_path
+                       FROM study_samples es
+                       JOIN samples s ON es.sample_id = s.id
+                       WHERE es.study_id = st.id
+                       ORDER BY es.display_order
+                   ) AS ordered
+               ) AS samples_json
+        FROM studies st
+        WHERE st.id = ?
+        """,
+        (study_id,)
+    )
+    row = await cursor.fetchone()
+    if not row:
+        return None
+
+    study = await row_to_dict(row)
+    study["samples"] = json_loads(study.pop("samples_json")) or []
+    return study
+
+
 # Assignment operations
 async def create_assignment(
     db: aiosqlite.Connection,
@@ -537,10 +629,10 @@ async def start_assignment(
     await db.execute(
         """
         UPDATE assignments
-        SET status = 'in_progress', randomization_seed = ?, started_at = datetime('now')
+        SET status = 'in_progress', randomization_seed = ?, started_at = ?
         WHERE id = ?
         """,
-        (randomization_seed, assignment_id)
+        (randomization_seed, utc_now(), assignment_id)
     )
     await db.commit()
 
@@ -588,24 +680,25 @@ async def generate_specialist_order(
     await db.commit()
 
 
-async def get_specialist_sample_order(
+async def get_sample_order_entry(
     db: aiosqlite.Connection,
-    assignment_id: int
-) -> list[dict]:
-    """Get the randomized sample order for a specialist."""
+    assignment_id: int,
+    position: int
+) -> Optional[dict]:
+    """Get a single entry of a specialist's sample order by its 1-based position."""
     cursor = await db.execute(
         """
         SELECT sso.specialist_order, sso.study_sample_id, es.sample_id, s.*
         FROM specialist_sample_order sso
         JOIN study_samples es ON sso.study_sample_id = es.id
         JOIN samples s ON es.sample_id = s.id
-        WHERE sso.assignment_id = ?
-        ORDER BY sso.specialist_order
+        WHERE sso.assignment_id = ? AND sso.specialist_order = ?
+        LIMIT 1
         """,
-        (assignment_id,)
+        (assignment_id, position)
     )
-    rows = await cursor.fetchall()
-    return await rows_to_dicts(rows)
+    row = await cursor.fetchone()
+    return await row_to_dict(row)
 
 
 # Annotation session operations
@@ -628,9 +721,14 @@ async def create_annotation_session(
 
 
 async def get_session_by_uuid(db: aiosqlite.Connection, session_uuid: str) -> Optional[dict]:
-    """Get an annotation session by UUID."""
+    """Get an annotation session by UUID, including the owning specialist_id."""
     cursor = await db.execute(
-        "SELECT * FROM annotation_sessions WHERE session_uuid = ?",
+        """
+        SELECT ans.*, a.specialist_id
+        FROM annotation_sessions ans
+        JOIN assignments a ON ans.assignment_id = a.id
+        WHERE ans.session_uuid = ?
+        """,
         (session_uuid,)
     )
     row = await cursor.fetchone()
@@ -677,10 +775,10 @@ async def complete_session(
     session_id: int,
     audio_filename: Optional[str],
     audio_duration_ms: Optional[int],
-    image_dimensions: dict,
-    layout_settings: dict
+    image_dimensions_json: str,
+    layout_settings_json: str
 ):
-    """Mark a session as completed."""
+    """Mark a session as completed. The layout/dimension payloads are pre-serialized JSON."""
     await db.execute(
         """
         UPDATE annotation_sessions
@@ -689,14 +787,15 @@ async def complete_session(
             audio_duration_ms = ?,
             image_dimensions_json = ?,
             layout_settings_json = ?,
-            completed_at = datetime('now')
+            completed_at = ?
         WHERE id = ?
         """,
         (
             audio_filename,
             audio_duration_ms,
-            json_dumps(image_dimensions),
-            json_dumps(layout_settings),
+            image_dimensions_json,
+            layout_settings_json,
+            utc_now(),
             session_id
         )
     )
@@ -706,30 +805,33 @@ async def complete_session(
 async def save_annotations(
     db: aiosqlite.Connection,
     session_id: int,
-    annotations: list[dict]
+    annotations: Iterable[dict]
 ):
-    """Save annotations for a session."""
-    for ann in annotations:
-        await db.execute(
-            """
-            INSERT INTO annotations (
-                session_id, annotation_type, color, lanes_json,
-                bbox_normalized_json, points_normalized_json,
-                timestamp_start_ms, timestamp_end_ms
-            )
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            """,
-            (
-                session_id,
-                ann["type"],
-                ann.get("color"),
-                json_dumps(ann.get("lanes", [])),
-                json_dumps(ann.get("bbox_normalized")),
-                json_dumps(ann.get("points_normalized")),
-                ann.get("timestamp_start_ms"),
-                ann.get("timestamp_end_ms")
-            )
+    """Save annotations for a session (one batched insert, one commit)."""
+    rows = (
+        (
+            session_id,
+            ann["type"],
+            ann.get("color"),
+            json_dumps(ann.get("lanes", [])),
+            json_dumps(ann.get("bbox_normalized")),
+            json_dumps(ann.get("points_normalized")),
+            ann.get("timestamp_start_ms"),
+            ann.get("timestamp_end_ms")
+        )
+        for ann in annotations
+    )
+    await db.executemany(
+        """
+        INSERT INTO annotations (
+            session_id, annotation_type, color, lanes_json,
+            bbox_normalized_json, points_normalized_json,
+            timestamp_start_ms, timestamp_end_ms
         )
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        rows
+    )
     await db.commit()
 
 
@@ -766,6 +868,42 @@ async def get_assignment_progress(
     }
 
 
+async def get_progress_for_specialist(
+    db: aiosqlite.Connection,
+    specialist_id: int
+) -> dict[int, dict]:
+    """Get progress for every assignment of a specialist in one query.
+
+    Returns a dict keyed by assignment_id, with the same shape as
+    get_assignment_progress().
+    """
+    cursor = await db.execute(
+        """
+        SELECT
+            a.id AS assignment_id,
+            (SELECT COUNT(*) FROM specialist_sample_order
+             WHERE assignment_id = a.id) AS total,
+            (SELECT COUNT(*) FROM annotation_sessions
+             WHERE assignment_id = a.id AND status = 'completed') AS completed
+        FROM assignments a
+        WHERE a.specialist_id = ?
+        """,
+        (specialist_id,)
+    )
+    rows = await cursor.fetchall()
+
+    progress = {}
+    for row in rows:
+        total, completed = row["total"], row["completed"]
+        progress[row["assignment_id"]] = {
+            "total": total,
+            "completed": completed,
+            "remaining": total - completed,
+            "percentage": round((completed / total) * 100, 1) if total > 0 else 0
+        }
+    return progress
+
+
 async def get_study_progress(
     db: aiosqlite.Connection,
     study_id: int
@@ -886,6 +1024,31 @@ async def get_sample_tags_by_position(db: aiosqlite.Connection, sample_id: int)
     return {tag['position']: tag['tag_id'] for tag in tags}
 
 
+async def get_sample_tags_by_positions(
+    db: aiosqlite.Connection,
+    sample_ids: list[int]
+) -> dict[int, dict]:
+    """Get tags for several samples in one query, keyed by sample_id then position."""
+    if not sample_ids:
+        return {}
+
+    placeholders = ", ".join("?" * len(sample_ids))
+    cursor = await db.execute(
+        f"""
+        SELECT sample_id, tag_id, position
+        FROM sample_tags
+        WHERE sample_id IN ({placeholders})
+        """,
+        tuple(sample_ids)
+    )
+    rows = await cursor.fetchall()
+
+    tags: dict[int, dict] = {}
+    for row in rows:
+        tags.setdefault(row["sample_id"], {})[row["position"]] = row["tag_id"]
+    return tags
+
+
 async def identify_sample_by_tags(
     db: aiosqlite.Connection,
     detected_tags: list[int],
@@ -24,7 +24,7 @@ mimetypes.add_type('audio/webm', '.webm')
 
 from .database import init_db, get_db_context, import_samples_from_manifest, migrate_legacy_annotations
 from .routers import auth_router, admin_router, specialist_router
-from .services.auth import get_current_user_optional
+from .services.auth import ADMIN_ROLES, get_current_user_optional
 
 # Paths
 BASE_DIR = Path(__file__).parent.parent
@@ -48,6 +48,12 @@ def load_config():
     return {}
 
 
+def count_lines(path: Path) -> int:
+    """Count newlines in a file using 1 MiB buffered reads and C-level bytes.count."""
+    with open(path, "rb") as f:
+        return sum(buf.count(b"\n") for buf in iter(lambda: f.read(1 << 20), b""))
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan - run on startup and shutdown."""
@@ -136,7 +142,7 @@ async def save_annotation(session: LegacyAnnotationSession):
         with open(ANNOTATIONS_FILE, "a") as f:
             f.write(json.dumps(session_data) + "\n")
 
-        total_sessions = sum(1 for _ in open(ANNOTATIONS_FILE)) if ANNOTATIONS_FILE.exists() else 1
+        total_sessions = count_lines(ANNOTATIONS_FILE) if ANNOTATIONS_FILE.exists() else 1
 
         return {
             "status": "success",
@@ -188,7 +194,7 @@ async def login_page(request: Request):
     user = await get_current_user_optional(request)
     if user:
         # Already logged in, redirect based on active role
-        if user.get("active_role") in ("admin", "super_admin"):
+        if user.get("active_role") in ADMIN_ROLES:
             return RedirectResponse(url="/admin", status_code=302)
         return RedirectResponse(url="/specialist", status_code=302)
 
@@ -201,7 +207,7 @@ async def admin_dashboard(request: Request):
     user = await get_current_user_optional(request)
     if not user:
         return RedirectResponse(url="/login", status_code=302)
-    if user.get("active_role") not in ("admin", "super_admin"):
+    if user.get("active_role") not in ADMIN_ROLES:
         return RedirectResponse(url="/specialist", status_code=302)
 
     return templates.TemplateResponse("admin/dashboard.html", {"request": request, "user": user})
@@ -211,7 +217,7 @@ async def admin_dashboard(request: Request):
 async def admin_studies(request: Request):
     """Render studies list page."""
     user = await get_current_user_optional(request)
-    if not user or user.get("active_role") not in ("admin", "super_admin"):
+    if not user or user.get("active_role") not in ADMIN_ROLES:
         return RedirectResponse(url="/login", status_code=302)
 
     return templates.TemplateResponse("admin/studies.html", {"request": request, "user": user})
@@ -221,7 +227,7 @@ async def admin_studies(request: Request):
 async def admin_new_study(request: Request):
     """Render new study page."""
     user = await get_current_user_optional(request)
-    if not user or user.get("active_role") not in ("admin", "super_admin"):
+    if not user or user.get("active_role") not in ADMIN_ROLES:
         return RedirectResponse(url="/login", status_code=302)
 
     return templates.TemplateResponse("admin/study_new.html", {"request": request, "user": user})
@@ -231,7 +237,7 @@ async def admin_new_study(request: Request):
 async def admin_study_detail(request: Request, study_id: int):
     """Render study detail page."""
     user = await get_current_user_optional(request)
-    if not user or user.get("active_role") not in ("admin", "super_admin"):
+    if not user or user.get("active_role") not in ADMIN_ROLES:
         return RedirectResponse(url="/login", status_code=302)
 
     return templates.TemplateResponse(
@@ -244,7 +250,7 @@ async def admin_study_detail(request: Request, study_id: int):
 async def admin_study_progress(request: Request, study_id: int):
     """Render study progress page."""
     user = await get_current_user_optional(request)
-    if not user or user.get("active_role") not in ("admin", "super_admin"):
+    if not user or user.get("active_role") not in ADMIN_ROLES:
         return RedirectResponse(url="/login", status_code=302)
 
     return templates.TemplateResponse(
@@ -257,7 +263,7 @@ async def admin_study_progress(request: Request, study_id: int):
 async def admin_session_replay(request: Request, study_id: int, session_id: int):
     """Render session replay page."""
     user = await get_current_user_optional(request)
-    if not user or user.get("active_role") not in ("admin", "super_admin"):
+    if not user or user.get("active_role") not in ADMIN_ROLES:
         return RedirectResponse(url="/login", status_code=302)
 
     return templates.TemplateResponse(
@@ -270,7 +276,7 @@ async def admin_session_replay(request: Request, study_id: int, session_id: int)
 async def admin_users(request: Request):
     """Render users management page."""
     user = await get_current_user_optional(request)
-    if not user or user.get("active_role") not in ("admin", "super_admin"):
+    if not user or user.get("active_role") not in ADMIN_ROLES:
         return RedirectResponse(url="/login", status_code=302)
 
     return templates.TemplateResponse("admin/users.html", {"request": request, "user": user})
@@ -313,7 +319,7 @@ async def root(request: Request):
     user = await get_current_user_optional(request)
     if not user:
         return RedirectResponse(url="/login", status_code=302)
-    if user.get("active_role") in ("admin", "super_admin"):
+    if user.get("active_role") in ADMIN_ROLES:
         return RedirectResponse(url="/admin", status_code=302)
     return RedirectResponse(url="/specialist", status_code=302)
 
@@ -4,6 +4,7 @@ from .auth import (
     UserCreate,
     UserLogin,
     UserResponse,
+    SpecialistSummary,
     Token,
     SwitchRoleRequest,
     UserUpdate,
@@ -34,6 +35,7 @@ __all__ = [
     "UserCreate",
     "UserLogin",
     "UserResponse",
+    "SpecialistSummary",
     "Token",
     "SwitchRoleRequest",
     "UserUpdate",
@@ -1,6 +1,6 @@
 """Authentication models."""
 
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 from typing import Optional, List
 
 
@@ -40,6 +40,8 @@ class UserLogin(BaseModel):
 
 class UserResponse(BaseModel):
     """Response model for user data."""
+    model_config = ConfigDict(from_attributes=True, extra="ignore")
+
     id: int
     email: str
     name: str
@@ -55,6 +57,15 @@ class UserResponse(BaseModel):
     created_at: Optional[str] = None
 
 
+class SpecialistSummary(BaseModel):
+    """Compact specialist listing for assignment pickers."""
+    id: int
+    email: str
+    name: str
+    expertise_level: Optional[str] = None
+    is_active: bool = True
+
+
 class SwitchRoleRequest(BaseModel):
     """Request model for switching active role."""
     role: str
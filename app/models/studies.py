@@ -1,6 +1,6 @@
 """Study models."""
 
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 from typing import Optional, List
 
 
@@ -21,6 +21,8 @@ class StudyUpdate(BaseModel):
 
 class StudyResponse(BaseModel):
     """Response model for study data."""
+    model_config = ConfigDict(from_attributes=True, extra="ignore")
+
     id: int
     name: str
     description: Optional[str] = None
@@ -33,6 +35,8 @@ class StudyResponse(BaseModel):
 
 class SampleInStudy(BaseModel):
     """Sample within a study context."""
+    model_config = ConfigDict(from_attributes=True, extra="ignore")
+
     study_sample_id: int
     display_order: int
     id: int  # sample id
@@ -56,6 +60,8 @@ class AssignmentCreate(BaseModel):
 
 class AssignmentResponse(BaseModel):
     """Response model for assignment data."""
+    model_config = ConfigDict(from_attributes=True, extra="ignore")
+
     id: int
     study_id: int
     specialist_id: int
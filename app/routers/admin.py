@@ -1,17 +1,19 @@
 """Admin API router."""
 
-from fastapi import APIRouter, HTTPException, status, Depends, Query
+from fastapi import APIRouter, HTTPException, status, Depends, Query, Request, Response
 from typing import List
 
 from ..database import (
     get_db_context,
     get_all_samples,
+    get_collection_version,
     get_all_studies,
     get_study_by_id,
     create_study,
     update_study_status,
     add_samples_to_study,
     get_study_samples,
+    get_study_with_samples,
     get_specialists,
     create_assignment,
     get_study_assignments,
@@ -21,9 +23,11 @@ from ..database import (
     update_user,
     deactivate_user,
     get_user_by_id_include_inactive,
+    get_user_with_email_conflict,
     get_user_by_email,
     get_user_roles,
     set_user_roles,
+    utc_now,
 )
 from ..models import (
     StudyCreate,
@@ -35,29 +39,52 @@ from ..models import (
     AssignmentCreate,
     AssignmentResponse,
 )
-from ..models.auth import UserCreate, UserUpdate, UserResponse
+from ..models.auth import UserCreate, UserUpdate, UserResponse, SpecialistSummary
 from ..models.studies import SampleInStudy, AssignmentProgress
-from ..services.auth import require_admin, require_super_admin, hash_password
+from ..services.auth import require_admin, require_super_admin, hash_password, invalidate_user_cache
 
 router = APIRouter(prefix="/api/admin", tags=["admin"])
 
 
+async def check_collection_etag(
+    db, collection: str, request: Request, response: Response
+) -> None:
+    """
+    Answer 304 if the client's copy of a collection is current, else set its ETag.
+
+    The weak ETag is derived from get_collection_version and checked on the
+    handler's own connection, so an unchanged list is never re-read or
+    re-serialized.
+    """
+    version = await get_collection_version(db, collection)
+
+    etag = f'W/"{collection}-{version}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in (tag.strip() for tag in if_none_match.split(",")):
+        raise HTTPException(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    response.headers.update(headers)
+
+
 # Sample endpoints
 @router.get("/samples", response_model=List[SampleResponse])
-async def list_samples(_: dict = Depends(require_admin)):
+async def list_samples(request: Request, response: Response, admin: dict = Depends(require_admin)):
     """Get all available samples."""
     async with get_db_context() as db:
+        await check_collection_etag(db, "samples", request, response)
         samples = await get_all_samples(db)
         return [SampleResponse(**s) for s in samples]
 
 
 # Study endpoints
 @router.get("/studies", response_model=List[StudyResponse])
-async def list_studies(_: dict = Depends(require_admin)):
+async def list_studies(request: Request, response: Response, admin: dict = Depends(require_admin)):
     """Get all studies."""
     async with get_db_context() as db:
+        await check_collection_etag(db, "studies", request, response)
         studies = await get_all_studies(db)
-        return [StudyResponse(**s) for s in studies]
+        return [StudyResponse.model_validate(s) for s in studies]
 
 
 @router.post("/studies", response_model=StudyResponse, status_code=status.HTTP_201_CREATED)
@@ -72,25 +99,18 @@ async def create_new_study(data: StudyCreate, admin: dict = Depends(require_admi
             created_by=admin["id"]
         )
         study = await get_study_by_id(db, study_id)
-        return StudyResponse(**study)
+        return StudyResponse.model_validate(study)
 
 
 @router.get("/studies/{study_id}", response_model=StudyWithSamples)
 async def get_study(study_id: int, _: dict = Depends(require_admin)):
     """Get a specific study with its samples."""
     async with get_db_context() as db:
-        study = await get_study_by_id(db, study_id)
+        study = await get_study_with_samples(db, study_id)
         if not study:
             raise HTTPException(status_code=404, detail="Study not found")
 
-        samples = await get_study_samples(db, study_id)
-        sample_models = [SampleInStudy(**s) for s in samples]
-
-        return StudyWithSamples(
-            **study,
-            samples=sample_models,
-            sample_count=len(sample_models)
-        )
+        return StudyWithSamples.model_validate({**study, "sample_count": len(study["samples"])})
 
 
 @router.put("/studies/{study_id}", response_model=StudyResponse)
@@ -102,20 +122,21 @@ async def update_study(study_id: int, data: StudyUpdate, _: dict = Depends(requi
             raise HTTPException(status_code=404, detail="Study not found")
 
         # Update fields
+        now = utc_now()
         if data.name is not None:
             await db.execute(
-                "UPDATE studies SET name = ?, updated_at = datetime('now') WHERE id = ?",
-                (data.name, study_id)
+                "UPDATE studies SET name = ?, updated_at = ? WHERE id = ?",
+                (data.name, now, study_id)
             )
         if data.description is not None:
             await db.execute(
-                "UPDATE studies SET description = ?, updated_at = datetime('now') WHERE id = ?",
-                (data.description, study_id)
+                "UPDATE studies SET description = ?, updated_at = ? WHERE id = ?",
+                (data.description, now, study_id)
             )
         if data.instructions is not None:
             await db.execute(
-                "UPDATE studies SET instructions = ?, updated_at = datetime('now') WHERE id = ?",
-                (data.instructions, study_id)
+                "UPDATE studies SET instructions = ?, updated_at = ? WHERE id = ?",
+                (data.instructions, now, study_id)
             )
         if data.status is not None:
             await update_study_status(db, study_id, data.status)
@@ -123,7 +144,7 @@ async def update_study(study_id: int, data: StudyUpdate, _: dict = Depends(requi
             await db.commit()
 
         study = await get_study_by_id(db, study_id)
-        return StudyResponse(**study)
+        return StudyResponse.model_validate(study)
 
 
 @router.delete("/studies/{study_id}")
@@ -229,7 +250,7 @@ async def get_study_sample_list(study_id: int, _: dict = Depends(require_admin))
             raise HTTPException(status_code=404, detail="Study not found")
 
         samples = await get_study_samples(db, study_id)
-        return [SampleInStudy(**s) for s in samples]
+        return [SampleInStudy.model_validate(s) for s in samples]
 
 
 @router.post("/studies/{study_id}/samples")
@@ -264,21 +285,12 @@ async def set_study_samples(
 
 
 # Specialist management
-@router.get("/specialists", response_model=List[dict])
-async def list_specialists(_: dict = Depends(require_admin)):
+@router.get("/specialists", response_model=List[SpecialistSummary])
+async def list_specialists(request: Request, response: Response, admin: dict = Depends(require_admin)):
     """Get all specialists."""
     async with get_db_context() as db:
-        specialists = await get_specialists(db)
-        return [
-            {
-                "id": s["id"],
-                "email": s["email"],
-                "name": s["name"],
-                "expertise_level": s.get("expertise_level"),
-                "is_active": bool(s["is_active"])
-            }
-            for s in specialists
-        ]
+        await check_collection_etag(db, "specialists", request, response)
+        return await get_specialists(db)
 
 
 # User management endpoints
@@ -296,26 +308,16 @@ async def list_users(
             # Fallback if user_roles is empty
             if not roles:
                 roles = [u["role"]]
-            result.append(UserResponse(
-                id=u["id"],
-                email=u["email"],
-                name=u["name"],
-                role=u["role"],
-                roles=roles,
-                expertise_level=u.get("expertise_level"),
-                years_experience=u.get("years_experience"),
-                training_date=u.get("training_date"),
-                institution=u.get("institution"),
-                specializations=u.get("specializations"),
-                is_active=bool(u["is_active"]),
-                created_at=u.get("created_at")
-            ))
+            result.append(UserResponse.model_validate({**u, "roles": roles}))
         return result
 
 
 @router.post("/users", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
 async def create_new_user(data: UserCreate, _: dict = Depends(require_super_admin)):
     """Create a new user (super_admin only)."""
+    # Hash outside the connection so the CPU-bound work doesn't hold it
+    password_hash = await hash_password(data.password)
+
     async with get_db_context() as db:
         # Check if email already exists
         existing = await get_user_by_email(db, data.email)
@@ -325,8 +327,6 @@ async def create_new_user(data: UserCreate, _: dict = Depends(require_super_admi
                 detail="User with this email already exists"
             )
 
-        password_hash = hash_password(data.password)
-
         # For the legacy users.role field, map super_admin to admin
         # (the users table constraint only allows 'admin' or 'specialist')
         legacy_role = data.role
@@ -351,19 +351,7 @@ async def create_new_user(data: UserCreate, _: dict = Depends(require_super_admi
             await set_user_roles(db, user_id, ['super_admin'])
 
         user = await get_user_by_id_include_inactive(db, user_id)
-        return UserResponse(
-            id=user["id"],
-            email=user["email"],
-            name=user["name"],
-            role=user["role"],
-            expertise_level=user.get("expertise_level"),
-            years_experience=user.get("years_experience"),
-            training_date=user.get("training_date"),
-            institution=user.get("institution"),
-            specializations=user.get("specializations"),
-            is_active=bool(user["is_active"]),
-            created_at=user.get("created_at")
-        )
+        return UserResponse.model_validate(user)
 
 
 @router.get("/users/{user_id}", response_model=UserResponse)
@@ -374,42 +362,28 @@ async def get_user(user_id: int, _: dict = Depends(require_admin)):
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
 
-        return UserResponse(
-            id=user["id"],
-            email=user["email"],
-            name=user["name"],
-            role=user["role"],
-            expertise_level=user.get("expertise_level"),
-            years_experience=user.get("years_experience"),
-            training_date=user.get("training_date"),
-            institution=user.get("institution"),
-            specializations=user.get("specializations"),
-            is_active=bool(user["is_active"]),
-            created_at=user.get("created_at")
-        )
+        return UserResponse.model_validate(user)
 
 
 @router.put("/users/{user_id}", response_model=UserResponse)
 async def update_existing_user(user_id: int, data: UserUpdate, _: dict = Depends(require_super_admin)):
     """Update a user (super_admin only)."""
+    # Hash password if being changed, outside the connection
+    password_hash = None
+    if data.password:
+        password_hash = await hash_password(data.password)
+
     async with get_db_context() as db:
-        user = await get_user_by_id_include_inactive(db, user_id)
+        user = await get_user_with_email_conflict(db, user_id, data.email)
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
 
-        # Check if email is being changed and already exists
-        if data.email and data.email != user["email"]:
-            existing = await get_user_by_email(db, data.email)
-            if existing:
-                raise HTTPException(
-                    status_code=400,
-                    detail="User with this email already exists"
-                )
-
-        # Hash password if being changed
-        password_hash = None
-        if data.password:
-            password_hash = hash_password(data.password)
+        # Check if email is being changed to one that already exists
+        if user.pop("email_conflict"):
+            raise HTTPException(
+                status_code=400,
+                detail="User with this email already exists"
+            )
 
         # For the legacy users.role field, map super_admin to admin
         # (the users table constraint only allows 'admin' or 'specialist')
@@ -425,7 +399,7 @@ async def update_existing_user(user_id: int, data: UserUpdate, _: dict = Depends
             if legacy_role == 'super_admin':
                 legacy_role = 'admin'
 
-        await update_user(
+        updated = await update_user(
             db,
             user_id=user_id,
             email=data.email,
@@ -439,34 +413,23 @@ async def update_existing_user(user_id: int, data: UserUpdate, _: dict = Depends
             specializations=data.specializations,
             is_active=data.is_active
         )
+        if updated:
+            user = updated
 
-        # Update user_roles table
+        # Update user_roles table (this also rewrites the legacy users.role)
         if data.roles:
             # If roles list is provided, replace all roles
-            await set_user_roles(db, user_id, data.roles)
+            user["role"] = await set_user_roles(db, user_id, data.roles)
         elif data.role:
             # Legacy: if single role is provided, add it to existing roles
             current_roles = await get_user_roles(db, user_id)
             if data.role not in current_roles:
                 new_roles = list(set(current_roles + [data.role]))
-                await set_user_roles(db, user_id, new_roles)
+                user["role"] = await set_user_roles(db, user_id, new_roles)
 
-        user = await get_user_by_id_include_inactive(db, user_id)
         roles = await get_user_roles(db, user_id)
-        return UserResponse(
-            id=user["id"],
-            email=user["email"],
-            name=user["name"],
-            role=user["role"],
-            roles=roles,
-            expertise_level=user.get("expertise_level"),
-            years_experience=user.get("years_experience"),
-            training_date=user.get("training_date"),
-            institution=user.get("institution"),
-            specializations=user.get("specializations"),
-            is_active=bool(user["is_active"]),
-            created_at=user.get("created_at")
-        )
+        invalidate_user_cache(user_id)
+        return UserResponse.model_validate({**user, "roles": roles})
 
 
 @router.delete("/users/{user_id}")
@@ -505,6 +468,7 @@ async def delete_user(user_id: int, admin: dict = Depends(require_super_admin)):
                 )
 
         await deactivate_user(db, user_id)
+        invalidate_user_cache(user_id)
 
         return {"status": "success", "message": "User deactivated"}
 
@@ -519,7 +483,7 @@ async def get_assignments(study_id: int, _: dict = Depends(require_admin)):
             raise HTTPException(status_code=404, detail="Study not found")
 
         assignments = await get_study_assignments(db, study_id)
-        return [AssignmentResponse(**a) for a in assignments]
+        return [AssignmentResponse.model_validate(a) for a in assignments]
 
 
 @router.post("/studies/{study_id}/assignments", response_model=AssignmentResponse)
@@ -565,7 +529,7 @@ async def create_new_assignment(
         assignments = await get_study_assignments(db, study_id)
         assignment = next((a for a in assignments if a["id"] == assignment_id), None)
 
-        return AssignmentResponse(**assignment)
+        return AssignmentResponse.model_validate(assignment)
 
 
 @router.get("/studies/{study_id}/assignments/{specialist_id}/stats")
@@ -653,7 +617,7 @@ async def get_progress(study_id: int, _: dict = Depends(require_admin)):
             raise HTTPException(status_code=404, detail="Study not found")
 
         progress = await get_study_progress(db, study_id)
-        progress["study"] = StudyResponse(**study).model_dump()
+        progress["study"] = StudyResponse.model_validate(study).model_dump()
 
         return progress
 
@@ -15,6 +15,31 @@ from ..services.auth import (
 
 router = APIRouter(prefix="/api/auth", tags=["auth"])
 
+# Cookie settings for browser-based access (the value is the raw JWT)
+_COOKIE_KWARGS = dict(
+    key="access_token",
+    httponly=True,
+    max_age=24 * 60 * 60,  # 24 hours
+    samesite="lax",
+)
+
+
+def _user_response(user: dict, **overrides) -> UserResponse:
+    """Build a UserResponse from a trusted user row without re-validating it."""
+    values = {**user, **overrides}
+    values["is_active"] = bool(values.get("is_active", True))
+    return UserResponse.model_construct(**values)
+
+
+def _issue_token_response(response: Response, user: dict, roles: list[str], active_role: str) -> Token:
+    """Issue a token for the given roles, set it as a cookie and build the Token response."""
+    token = create_token_with_role(user["id"], roles, active_role)
+    response.set_cookie(value=token, **_COOKIE_KWARGS)
+    return Token.model_construct(
+        access_token=token,
+        user=_user_response(user, roles=roles, active_role=active_role)
+    )
+
 
 @router.post("/login", response_model=Token)
 async def login(data: UserLogin, response: Response):
@@ -22,7 +47,7 @@ async def login(data: UserLogin, response: Response):
     async with get_db_context() as db:
         user = await get_user_by_email(db, data.email)
 
-        if not user or not verify_password(data.password, user["password_hash"]):
+        if not user or not await verify_password(data.password, user["password_hash"]):
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid email or password"
@@ -43,32 +68,7 @@ async def login(data: UserLogin, response: Response):
         else:
             active_role = roles[0]
 
-        # Create token with roles
-        token = create_token_with_role(user["id"], roles, active_role)
-
-        # Set cookie for browser-based access
-        response.set_cookie(
-            key="access_token",
-            value=f"Bearer {token}",
-            httponly=True,
-            max_age=24 * 60 * 60,  # 24 hours
-            samesite="lax"
-        )
-
-        return Token(
-            access_token=token,
-            user=UserResponse(
-                id=user["id"],
-                email=user["email"],
-                name=user["name"],
-                role=user["role"],
-                roles=roles,
-                active_role=active_role,
-                expertise_level=user.get("expertise_level"),
-                is_active=bool(user["is_active"]),
-                created_at=user.get("created_at")
-            )
-        )
+        return _issue_token_response(response, user, roles, active_role)
 
 
 @router.post("/logout")
@@ -81,17 +81,7 @@ async def logout(response: Response):
 @router.get("/me", response_model=UserResponse)
 async def get_me(user: dict = Depends(get_current_user)):
     """Get the current authenticated user."""
-    return UserResponse(
-        id=user["id"],
-        email=user["email"],
-        name=user["name"],
-        role=user["role"],
-        roles=user.get("roles", [user["role"]]),
-        active_role=user.get("active_role", user["role"]),
-        expertise_level=user.get("expertise_level"),
-        is_active=bool(user["is_active"]),
-        created_at=user.get("created_at")
-    )
+    return _user_response(user)
 
 
 @router.post("/switch-role", response_model=Token)
@@ -105,37 +95,16 @@ async def switch_role(data: SwitchRoleRequest, response: Response, user: dict =
             detail=f"User does not have the '{data.role}' role"
         )
 
-    # Create new token with the new active role
-    token = create_token_with_role(user["id"], roles, data.role)
-
-    # Set cookie for browser-based access
-    response.set_cookie(
-        key="access_token",
-        value=f"Bearer {token}",
-        httponly=True,
-        max_age=24 * 60 * 60,  # 24 hours
-        samesite="lax"
-    )
-
-    return Token(
-        access_token=token,
-        user=UserResponse(
-            id=user["id"],
-            email=user["email"],
-            name=user["name"],
-            role=user["role"],
-            roles=roles,
-            active_role=data.role,
-            expertise_level=user.get("expertise_level"),
-            is_active=bool(user["is_active"]),
-            created_at=user.get("created_at")
-        )
-    )
+    # Issue a new token with the new active role
+    return _issue_token_response(response, user, roles, data.role)
 
 
 @router.post("/users", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
 async def create_new_user(data: UserCreate, admin: dict = Depends(require_admin)):
     """Create a new user (admin only)."""
+    # Hash outside the connection so the CPU-bound work doesn't hold it
+    password_hash = await hash_password(data.password)
+
     async with get_db_context() as db:
         # Check if email already exists
         existing = await get_user_by_email(db, data.email)
@@ -146,7 +115,6 @@ async def create_new_user(data: UserCreate, admin: dict = Depends(require_admin)
             )
 
         # Create user
-        password_hash = hash_password(data.password)
         user_id = await create_user(
             db,
             email=data.email,
@@ -156,7 +124,7 @@ async def create_new_user(data: UserCreate, admin: dict = Depends(require_admin)
             expertise_level=data.expertise_level
         )
 
-        return UserResponse(
+        return UserResponse.model_construct(
             id=user_id,
             email=data.email,
             name=data.name,
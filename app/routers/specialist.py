@@ -1,9 +1,11 @@
 """Specialist API router."""
 
+import asyncio
 import base64
-import uuid
+import secrets
 import time
 from pathlib import Path
+from typing import Optional
 
 from fastapi import APIRouter, HTTPException, status, Depends
 
@@ -11,16 +13,18 @@ from ..database import (
     get_db_context,
     get_assignment,
     get_specialist_assignments,
-    get_specialist_sample_order,
+    get_sample_order_entry,
     start_assignment,
     generate_specialist_order,
     get_assignment_progress,
+    get_progress_for_specialist,
     create_annotation_session,
     get_session_by_uuid,
     get_current_session_for_assignment,
     complete_session,
     save_annotations,
-    get_sample_tags_by_position,
+    get_sample_tags_by_positions,
+    utc_now,
 )
 from ..models import (
     AssignmentResponse,
@@ -38,17 +42,23 @@ AUDIO_DIR = BASE_DIR / "data" / "audio"
 AUDIO_DIR.mkdir(parents=True, exist_ok=True)
 
 
+def _write_audio(audio_path: Path, data_base64: str) -> None:
+    """Decode a base64 audio payload and write it to disk (blocking; run in a thread)."""
+    audio_path.write_bytes(base64.b64decode(data_base64))
+
+
 @router.get("/studies")
 async def list_my_studies(user: dict = Depends(require_specialist)):
     """Get all studies assigned to the current specialist."""
     async with get_db_context() as db:
         assignments = await get_specialist_assignments(db, user["id"])
+        progress_by_assignment = await get_progress_for_specialist(db, user["id"])
 
         result = []
         for a in assignments:
-            progress = await get_assignment_progress(db, a["id"]) if a["status"] != "pending" else None
+            progress = progress_by_assignment.get(a["id"]) if a["status"] != "pending" else None
             result.append({
-                "assignment": AssignmentResponse(**a).model_dump(),
+                "assignment": AssignmentResponse.model_validate(a).model_dump(),
                 "progress": progress
             })
 
@@ -91,6 +101,29 @@ async def start_study(study_id: int, user: dict = Depends(require_specialist)):
         }
 
 
+def _build_sample_info(row: dict, tags_dict: Optional[dict]) -> SampleInfo:
+    """Build a SampleInfo from a sample order row and its position -> tag mapping.
+
+    Values come straight from our own typed columns, so validation is skipped.
+    """
+    sample_tags = SampleTags.model_construct(
+        top_left=tags_dict.get("top-left"),
+        top_right=tags_dict.get("top-right"),
+        bottom_left=tags_dict.get("bottom-left"),
+        bottom_right=tags_dict.get("bottom-right")
+    ) if tags_dict else None
+
+    return SampleInfo.model_construct(
+        id=row["sample_id"],
+        drug_name=row["drug_name"],
+        drug_name_display=row["drug_name_display"],
+        card_id=row["card_id"],
+        filename=row["filename"],
+        image_path=row["image_path"],
+        tags=sample_tags
+    )
+
+
 @router.get("/studies/{study_id}/current", response_model=SessionProgressResponse)
 async def get_current_sample(study_id: int, user: dict = Depends(require_specialist)):
     """Get the current sample to annotate for a study."""
@@ -108,7 +141,7 @@ async def get_current_sample(study_id: int, user: dict = Depends(require_special
         progress = await get_assignment_progress(db, assignment["id"])
 
         if assignment["status"] == "completed" or progress["remaining"] == 0:
-            return SessionProgressResponse(
+            return SessionProgressResponse.model_construct(
                 current_position=progress["total"],
                 total_samples=progress["total"],
                 completed=progress["completed"],
@@ -120,7 +153,7 @@ async def get_current_sample(study_id: int, user: dict = Depends(require_special
         current = await get_current_session_for_assignment(db, assignment["id"])
         if not current:
             # All done
-            return SessionProgressResponse(
+            return SessionProgressResponse.model_construct(
                 current_position=progress["total"],
                 total_samples=progress["total"],
                 completed=progress["completed"],
@@ -133,7 +166,7 @@ async def get_current_sample(study_id: int, user: dict = Depends(require_special
         session_id = current.get("session_id")
 
         if not session_uuid:
-            session_uuid = str(uuid.uuid4())
+            session_uuid = secrets.token_hex(16)
             session_id = await create_annotation_session(
                 db,
                 assignment_id=assignment["id"],
@@ -141,51 +174,23 @@ async def get_current_sample(study_id: int, user: dict = Depends(require_special
                 session_uuid=session_uuid
             )
 
-        # Get tags for current sample
-        tags_dict = await get_sample_tags_by_position(db, current["sample_id"])
-        sample_tags = SampleTags(
-            top_left=tags_dict.get("top-left"),
-            top_right=tags_dict.get("top-right"),
-            bottom_left=tags_dict.get("bottom-left"),
-            bottom_right=tags_dict.get("bottom-right")
-        ) if tags_dict else None
-
-        sample = SampleInfo(
-            id=current["sample_id"],
-            drug_name=current["drug_name"],
-            drug_name_display=current["drug_name_display"],
-            card_id=current["card_id"],
-            filename=current["filename"],
-            image_path=current["image_path"],
-            tags=sample_tags
-        )
-
-        # Get next sample info for confirmation dialog
-        next_sample = None
-        all_samples = await get_specialist_sample_order(db, assignment["id"])
+        # Resolve the next sample (for the confirmation dialog) by position only
         current_order = current.get("specialist_order", 1)
-        if current_order < len(all_samples):
-            next_s = all_samples[current_order]  # 0-indexed, current_order is 1-indexed
-            # Get tags for next sample
-            next_tags_dict = await get_sample_tags_by_position(db, next_s.get("sample_id", next_s["id"]))
-            next_sample_tags = SampleTags(
-                top_left=next_tags_dict.get("top-left"),
-                top_right=next_tags_dict.get("top-right"),
-                bottom_left=next_tags_dict.get("bottom-left"),
-                bottom_right=next_tags_dict.get("bottom-right")
-            ) if next_tags_dict else None
-
-            next_sample = SampleInfo(
-                id=next_s.get("sample_id", next_s["id"]),
-                drug_name=next_s["drug_name"],
-                drug_name_display=next_s["drug_name_display"],
-                card_id=next_s["card_id"],
-                filename=next_s["filename"],
-                image_path=next_s["image_path"],
-                tags=next_sample_tags
-            )
+        next_s = await get_sample_order_entry(db, assignment["id"], current_order + 1)
+
+        # Fetch tags for current and next sample in one query
+        sample_ids = [current["sample_id"]]
+        if next_s:
+            sample_ids.append(next_s["sample_id"])
+        tags_by_sample = await get_sample_tags_by_positions(db, sample_ids)
+
+        sample = _build_sample_info(current, tags_by_sample.get(current["sample_id"]))
+        next_sample = (
+            _build_sample_info(next_s, tags_by_sample.get(next_s["sample_id"]))
+            if next_s else None
+        )
 
-        return SessionProgressResponse(
+        return SessionProgressResponse.model_construct(
             session_uuid=session_uuid,
             session_id=session_id,
             sample=sample,
@@ -214,17 +219,7 @@ async def complete_annotation_session(
             raise HTTPException(status_code=400, detail="Session already completed")
 
         # Verify user owns this session
-        cursor = await db.execute(
-            """
-            SELECT a.specialist_id
-            FROM annotation_sessions ans
-            JOIN assignments a ON ans.assignment_id = a.id
-            WHERE ans.id = ?
-            """,
-            (session["id"],)
-        )
-        row = await cursor.fetchone()
-        if not row or row["specialist_id"] != user["id"]:
+        if session["specialist_id"] != user["id"]:
             raise HTTPException(status_code=403, detail="Not your session")
 
         # Save audio file if present
@@ -233,15 +228,14 @@ async def complete_annotation_session(
         if data.audio and data.audio.data_base64:
             audio_filename = f"{session_uuid}.webm"
             audio_path = AUDIO_DIR / audio_filename
-            audio_bytes = base64.b64decode(data.audio.data_base64)
-            audio_path.write_bytes(audio_bytes)
+            await asyncio.to_thread(_write_audio, audio_path, data.audio.data_base64)
             audio_duration_ms = data.audio.duration_ms
 
         # Save annotations
         await save_annotations(
             db,
             session["id"],
-            [ann.model_dump() for ann in data.annotations]
+            (ann.model_dump() for ann in data.annotations)
         )
 
         # Complete session
@@ -250,23 +244,18 @@ async def complete_annotation_session(
             session["id"],
             audio_filename=audio_filename,
             audio_duration_ms=audio_duration_ms,
-            image_dimensions=data.image_dimensions.model_dump(),
-            layout_settings=data.layout_settings.model_dump() if data.layout_settings else {}
+            image_dimensions_json=data.image_dimensions.model_dump_json(),
+            layout_settings_json=data.layout_settings.model_dump_json() if data.layout_settings else "{}"
         )
 
         # Get updated progress
-        cursor = await db.execute(
-            "SELECT assignment_id FROM annotation_sessions WHERE id = ?",
-            (session["id"],)
-        )
-        row = await cursor.fetchone()
-        progress = await get_assignment_progress(db, row["assignment_id"])
+        progress = await get_assignment_progress(db, session["assignment_id"])
 
         # Check if all samples are complete
         if progress["remaining"] == 0:
             await db.execute(
-                "UPDATE assignments SET status = 'completed', completed_at = datetime('now') WHERE id = ?",
-                (row["assignment_id"],)
+                "UPDATE assignments SET status = 'completed', completed_at = ? WHERE id = ?",
+                (utc_now(), session["assignment_id"])
             )
             await db.commit()
 
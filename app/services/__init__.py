@@ -4,16 +4,26 @@ from .auth import (
     hash_password,
     verify_password,
     create_access_token,
+    create_token_with_role,
     decode_token,
     get_current_user,
+    get_current_user_optional,
+    require_super_admin,
     require_admin,
+    require_specialist,
+    invalidate_user_cache,
 )
 
 __all__ = [
     "hash_password",
     "verify_password",
     "create_access_token",
+    "create_token_with_role",
     "decode_token",
     "get_current_user",
+    "get_current_user_optional",
+    "require_super_admin",
     "require_admin",
+    "require_specialist",
+    "invalidate_user_cache",
 ]
@@ -1,13 +1,18 @@
 """Authentication service with JWT and password hashing."""
 
+import asyncio
 import os
+import time
 import bcrypt
+import jwt
+from collections import OrderedDict
 from datetime import datetime, timedelta, timezone
+from functools import lru_cache
 from typing import Optional
 
 from fastapi import Depends, HTTPException, status, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from jose import JWTError, jwt
+from jwt.exceptions import InvalidTokenError as JWTError
 
 from ..database import get_db_context, get_user_by_id, get_user_roles
 
@@ -16,23 +21,45 @@ SECRET_KEY = os.getenv("JWT_SECRET_KEY", "pad-salience-annotations-secret-key-ch
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_HOURS = 24
 
+# Encoded once so encode/decode don't re-encode the key or rebuild the list per call
+_SECRET_BYTES = SECRET_KEY.encode("utf-8")
+_ALGORITHMS = (ALGORITHM,)
+
+# bcrypt work factor (each +1 doubles hashing time)
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+
+# Active roles accepted by the require_* guards
+ADMIN_ROLES = frozenset({"admin", "super_admin"})
+SPECIALIST_ROLES = frozenset({"specialist", "admin", "super_admin"})
+
 # Bearer token scheme
 security = HTTPBearer(auto_error=False)
+_BEARER = "Bearer "
+_BEARER_LEN = len(_BEARER)
 
+# Resolved users are cached per token so repeat requests skip the database.
+# Entries live for at most USER_CACHE_TTL_SECONDS (or until the token expires)
+# and are dropped early when invalidate_user_cache() bumps the user's epoch.
+USER_CACHE_TTL_SECONDS = 60
+USER_CACHE_MAXSIZE = 4096
+_user_cache: OrderedDict[str, tuple[float, int, int, dict]] = OrderedDict()
+_user_epochs: dict[int, int] = {}
 
-def hash_password(password: str) -> str:
-    """Hash a password using bcrypt."""
+
+async def hash_password(password: str) -> str:
+    """Hash a password using bcrypt (in a worker thread, off the event loop)."""
     password_bytes = password.encode('utf-8')
-    salt = bcrypt.gensalt()
-    return bcrypt.hashpw(password_bytes, salt).decode('utf-8')
+    salt = bcrypt.gensalt(rounds=BCRYPT_ROUNDS)
+    hashed = await asyncio.to_thread(bcrypt.hashpw, password_bytes, salt)
+    return hashed.decode('utf-8')
 
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Verify a password against its hash."""
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    """Verify a password against its hash (in a worker thread, off the event loop)."""
     try:
         password_bytes = plain_password.encode('utf-8')
         hashed_bytes = hashed_password.encode('utf-8')
-        return bcrypt.checkpw(password_bytes, hashed_bytes)
+        return await asyncio.to_thread(bcrypt.checkpw, password_bytes, hashed_bytes)
     except Exception:
         return False
 
@@ -40,25 +67,101 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Create a JWT access token."""
     to_encode = data.copy()
+    now = datetime.now(timezone.utc)
     if expires_delta:
-        expire = datetime.now(timezone.utc) + expires_delta
+        expire = now + expires_delta
     else:
-        expire = datetime.now(timezone.utc) + timedelta(hours=ACCESS_TOKEN_EXPIRE_HOURS)
-    to_encode.update({"exp": expire})
-    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+        expire = now + timedelta(hours=ACCESS_TOKEN_EXPIRE_HOURS)
+    to_encode.update({"exp": expire, "iat": now})
+    return jwt.encode(to_encode, _SECRET_BYTES, algorithm=ALGORITHM)
 
 
-def decode_token(token: str) -> Optional[dict]:
-    """Decode and validate a JWT token."""
+@lru_cache(maxsize=8192)
+def _decode_verified(token: str) -> Optional[dict]:
+    """Verify a token's signature and parse its claims (memoized per token)."""
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        return payload
+        return jwt.decode(token, _SECRET_BYTES, algorithms=_ALGORITHMS)
     except JWTError:
         return None
 
 
+def decode_token(token: str) -> Optional[dict]:
+    """Decode and validate a JWT token."""
+    payload = _decode_verified(token)
+    if payload is None:
+        return None
+
+    # The memoized payload was verified when first seen; re-check expiry here
+    exp = payload.get("exp")
+    if exp is not None and exp <= time.time():
+        return None
+
+    return dict(payload)
+
+
+def invalidate_user_cache(user_id: int) -> None:
+    """Forget cached token resolutions for a user (after their account or roles change)."""
+    _user_epochs[user_id] = _user_epochs.get(user_id, 0) + 1
+
+
+def _get_cached_user(token: str) -> Optional[dict]:
+    """Return a copy of the cached user for a token, if still fresh."""
+    entry = _user_cache.get(token)
+    if entry is None:
+        return None
+
+    expires_at, user_id, epoch, user = entry
+    if expires_at <= time.time() or _user_epochs.get(user_id, 0) != epoch:
+        del _user_cache[token]
+        return None
+
+    _user_cache.move_to_end(token)
+    return dict(user)
+
+
+def _cache_user(token: str, payload: dict, epoch: int, user: dict) -> None:
+    """Cache a resolved user until the TTL or the token's expiry, whichever comes first."""
+    expires_at = time.time() + USER_CACHE_TTL_SECONDS
+    if payload.get("exp"):
+        expires_at = min(expires_at, float(payload["exp"]))
+
+    _user_cache[token] = (expires_at, user["id"], epoch, dict(user))
+    _user_cache.move_to_end(token)
+    while len(_user_cache) > USER_CACHE_MAXSIZE:
+        _user_cache.popitem(last=False)
+
+
+def _roles_claim_is_current(user: dict, payload: dict) -> bool:
+    """
+    Whether the token's roles claim can be trusted for this user.
+
+    Any role change bumps users.updated_at, so the claim is current when the
+    token was issued strictly after the user's last update. Tokens without
+    an iat claim (issued before it was added) always fall back to the database.
+    """
+    issued_at = payload.get("iat")
+    if not payload.get("roles") or issued_at is None:
+        return False
+
+    updated_at = user.get("updated_at")
+    if not updated_at:
+        return True
+
+    try:
+        updated_ts = datetime.strptime(updated_at, "%Y-%m-%d %H:%M:%S").replace(
+            tzinfo=timezone.utc
+        ).timestamp()
+    except ValueError:
+        return False
+    return updated_ts < issued_at
+
+
 async def get_current_user_from_token(token: str) -> Optional[dict]:
     """Get current user from JWT token."""
+    cached = _get_cached_user(token)
+    if cached:
+        return cached
+
     payload = decode_token(token)
     if not payload:
         return None
@@ -67,17 +170,24 @@ async def get_current_user_from_token(token: str) -> Optional[dict]:
     if not user_id:
         return None
 
+    # Read the epoch before querying so an invalidation during the query wins
+    epoch = _user_epochs.get(int(user_id), 0)
+
     async with get_db_context() as db:
         user = await get_user_by_id(db, int(user_id))
         if not user:
             return None
 
-        # Get roles from database
-        roles = await get_user_roles(db, int(user_id))
+        if _roles_claim_is_current(user, payload):
+            # Roles haven't changed since the token was issued; skip the query
+            roles = list(payload["roles"])
+        else:
+            # Get roles from database
+            roles = await get_user_roles(db, int(user_id))
 
-        # Fallback: if user_roles table is empty, use the role from users table
-        if not roles:
-            roles = [user["role"]]
+            # Fallback: if user_roles table is empty, use the role from users table
+            if not roles:
+                roles = [user["role"]]
 
         user["roles"] = roles
 
@@ -88,22 +198,22 @@ async def get_current_user_from_token(token: str) -> Optional[dict]:
 
         user["active_role"] = active_role
 
-        return user
+    _cache_user(token, payload, epoch, user)
+    return user
 
 
 def extract_token_from_request(request: Request) -> Optional[str]:
     """Extract token from Authorization header or cookie (can be called directly)."""
     # Try Authorization header first
     auth_header = request.headers.get("Authorization")
-    if auth_header and auth_header.startswith("Bearer "):
-        return auth_header[7:]
+    if auth_header and auth_header[:_BEARER_LEN] == _BEARER:
+        return auth_header[_BEARER_LEN:]
 
-    # Try cookie
+    # Try cookie (stored as the raw token; older cookies carry a 'Bearer ' prefix)
     token = request.cookies.get("access_token")
     if token:
-        # Remove 'Bearer ' prefix if present
-        if token.startswith("Bearer "):
-            token = token[7:]
+        if token[:_BEARER_LEN] == _BEARER:
+            token = token[_BEARER_LEN:]
         return token
 
     return None
@@ -159,7 +269,7 @@ async def require_super_admin(user: dict = Depends(get_current_user)) -> dict:
 
 async def require_admin(user: dict = Depends(get_current_user)) -> dict:
     """Require the current user to be acting as admin or super_admin."""
-    if user.get("active_role") not in ("admin", "super_admin"):
+    if user.get("active_role") not in ADMIN_ROLES:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Admin access required"
@@ -169,7 +279,7 @@ async def require_admin(user: dict = Depends(get_current_user)) -> dict:
 
 async def require_specialist(user: dict = Depends(get_current_user)) -> dict:
     """Require the current user to be acting as a specialist (or admin/super_admin)."""
-    if user.get("active_role") not in ("specialist", "admin", "super_admin"):
+    if user.get("active_role") not in SPECIALIST_ROLES:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Specialist access required"
@@ -5,10 +5,63 @@ This image can be given to participants to show what the eye-tracking surface lo
 """
 
 import argparse
+import io
+from functools import lru_cache
 from pathlib import Path
 from typing import Optional
+import numpy as np
 from PIL import Image, ImageDraw, ImageFont
 
+try:
+    import simplejpeg  # Optional: libjpeg-turbo JPEG decoder, much faster than Pillow's
+except ImportError:
+    simplejpeg = None
+
+JPEG_MAGIC = b"\xff\xd8\xff"
+
+
+def load_rgba(path: Path) -> Image.Image:
+    """Load an image as RGBA, decoding JPEGs with simplejpeg when it is installed."""
+    if simplejpeg is None:
+        return Image.open(path).convert("RGBA")
+
+    data = path.read_bytes()
+    if data[:3] == JPEG_MAGIC:
+        try:
+            return Image.fromarray(simplejpeg.decode_jpeg(data, colorspace="RGBA"), "RGBA")
+        except ValueError:
+            # libjpeg-turbo can't convert some inputs (e.g. CMYK); let Pillow handle them
+            pass
+    return Image.open(io.BytesIO(data)).convert("RGBA")
+
+
+@lru_cache(maxsize=64)
+def load_tag(path: str, size: int) -> Image.Image:
+    """Load an AprilTag PNG resized to size x size (cached; callers should copy before mutating)."""
+    tag = Image.open(path).convert("RGBA")
+    return tag.resize((size, size), Image.NEAREST)
+
+
+@lru_cache(maxsize=1)
+def get_label_font() -> ImageFont.ImageFont:
+    """Load the tag label font once (falls back to PIL's default font)."""
+    try:
+        return ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", 12)
+    except OSError:
+        return ImageFont.load_default()
+
+
+@lru_cache(maxsize=64)
+def label_width(label: str) -> int:
+    """Rendered width of a tag label in the label font (cached per label)."""
+    font = get_label_font()
+    try:
+        left, _, right, _ = font.getbbox(label)
+    except AttributeError:
+        # Fallback for older PIL versions
+        return font.getsize(label)[0]
+    return right - left
+
 
 def generate_eyetracking_layout(
     pad_image_path: Optional[str] = None,
@@ -16,6 +69,7 @@ def generate_eyetracking_layout(
     tag_size: int = 50,
     tag_margin: int = 10,
     background_color: str = "#1a1a2e",
+    compress_level: int = 1,
 ):
     """
     Generate an image showing the eye-tracking layout.
@@ -26,6 +80,7 @@ def generate_eyetracking_layout(
         tag_size: Size of AprilTag markers in pixels.
         tag_margin: Margin between tags and the PAD image.
         background_color: Background color (hex).
+        compress_level: PNG zlib level, 0-9 (1 encodes fast; 9 gives the smallest file).
     """
     base_dir = Path(__file__).parent
 
@@ -41,9 +96,7 @@ def generate_eyetracking_layout(
     tags = {}
     for position, path in tag_files.items():
         if path.exists():
-            tag = Image.open(path).convert("RGBA")
-            tag = tag.resize((tag_size, tag_size), Image.NEAREST)
-            tags[position] = tag
+            tags[position] = np.asarray(load_tag(str(path), tag_size))
         else:
             print(f"Warning: AprilTag not found at {path}")
             return None
@@ -64,7 +117,7 @@ def generate_eyetracking_layout(
         print(f"Error: PAD image not found at {pad_path}")
         return None
 
-    pad_image = Image.open(pad_path).convert("RGBA")
+    pad_image = load_rgba(pad_path)
     pad_width, pad_height = pad_image.size
 
     # Calculate canvas size
@@ -72,18 +125,18 @@ def generate_eyetracking_layout(
     canvas_width = tag_size + tag_margin + pad_width + tag_margin + tag_size
     canvas_height = tag_size + tag_margin + pad_height + tag_margin + tag_size
 
-    # Create canvas
+    # Create canvas (composed as a single array, converted to PIL for the labels)
     bg_color = tuple(int(background_color.lstrip("#")[i:i+2], 16) for i in (0, 2, 4))
-    canvas = Image.new("RGB", (canvas_width, canvas_height), bg_color)
+    canvas_np = np.full((canvas_height, canvas_width, 3), bg_color, dtype=np.uint8)
 
     # Calculate positions
     pad_x = tag_size + tag_margin
     pad_y = tag_size + tag_margin
 
-    # Paste PAD image
-    canvas.paste(pad_image, (pad_x, pad_y))
+    # Copy PAD image (RGB only, as an unmasked paste would)
+    canvas_np[pad_y:pad_y + pad_height, pad_x:pad_x + pad_width] = np.asarray(pad_image)[..., :3]
 
-    # Add white background behind tags for visibility
+    # Tag positions (each tag gets a white background for visibility)
     tag_positions = {
         "top_left": (0, 0),
         "top_right": (canvas_width - tag_size, 0),
@@ -91,20 +144,18 @@ def generate_eyetracking_layout(
         "bottom_right": (canvas_width - tag_size, canvas_height - tag_size),
     }
 
-    # Paste tags with white background
+    # Alpha-blend tags over white: out = rgb * a + 255 * (1 - a)
     for position, (x, y) in tag_positions.items():
-        # White background
-        white_bg = Image.new("RGB", (tag_size, tag_size), (255, 255, 255))
-        canvas.paste(white_bg, (x, y))
-        # Tag image
-        canvas.paste(tags[position], (x, y), tags[position])
+        tag = tags[position].astype(np.uint16)
+        rgb, alpha = tag[..., :3], tag[..., 3:4]
+        blended = (rgb * alpha + 255 * (255 - alpha) + 127) // 255
+        canvas_np[y:y + tag_size, x:x + tag_size] = blended.astype(np.uint8)
+
+    canvas = Image.fromarray(canvas_np, "RGB")
 
     # Add tag labels
     draw = ImageDraw.Draw(canvas)
-    try:
-        font = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", 12)
-    except OSError:
-        font = ImageFont.load_default()
+    font = get_label_font()
 
     tag_labels = {
         "top_left": ("tag 0", (tag_size // 2, tag_size + 5)),
@@ -114,17 +165,11 @@ def generate_eyetracking_layout(
     }
 
     for label, (x, y) in tag_labels.values():
-        try:
-            text_width, _ = draw.textsize(label, font=font)
-        except AttributeError:
-            # Fallback for newer PIL versions
-            bbox = draw.textbbox((0, 0), label, font=font)
-            text_width = bbox[2] - bbox[0]
-        draw.text((x - text_width // 2, y), label, fill="#666666", font=font)
+        draw.text((x - label_width(label) // 2, y), label, fill="#666666", font=font)
 
     # Save
     output = Path(output_path)
-    canvas.save(output, "PNG")
+    canvas.save(output, "PNG", compress_level=compress_level, optimize=False)
     print(f"Generated eye-tracking layout image: {output}")
     print(f"  Canvas size: {canvas_width} x {canvas_height}")
     print(f"  PAD image: {pad_path.name} ({pad_width} x {pad_height})")
@@ -167,6 +212,14 @@ def main():
         default="#1a1a2e",
         help="Background color in hex (default: #1a1a2e)"
     )
+    parser.add_argument(
+        "--compress-level",
+        type=int,
+        default=1,
+        choices=range(10),
+        metavar="0-9",
+        help="PNG compression level; higher is smaller but slower (default: 1)"
+    )
 
     args = parser.parse_args()
 
@@ -176,6 +229,7 @@ def main():
         tag_size=args.tag_size,
         tag_margin=args.tag_margin,
         background_color=args.background,
+        compress_level=args.compress_level,
     )
 
 
@@ -0,0 +1,17 @@
+-- PAD Salience Annotation System - Dashboard Indexes
+-- Version: 008
+-- Created: 2026-10-15
+-- Purpose: Support the admin dashboard's recent-activity query
+
+-- Partial index over completed sessions ordered by completion time.
+-- Lets "WHERE status = 'completed' ... ORDER BY completed_at DESC LIMIT 10"
+-- walk the index instead of sorting every completed session in a temp b-tree.
+CREATE INDEX IF NOT EXISTS idx_sessions_completed
+    ON annotation_sessions(status, completed_at DESC)
+    WHERE status = 'completed';
+
+-- Note: assignments(study_id, specialist_id) is already covered by the
+-- UNIQUE(study_id, specialist_id) constraint's automatic index.
+
+-- Insert migration record
+INSERT OR IGNORE INTO migrations (version) VALUES ('008_dashboard_indexes');
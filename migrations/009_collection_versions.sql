@@ -0,0 +1,82 @@
+-- PAD Salience Annotation System - Collection Versions
+-- Version: 009
+-- Created: 2026-10-15
+-- Purpose: Change counters behind the admin list ETags
+
+-- One counter per cached admin list, bumped by triggers on every write.
+-- updated_at only has one-second resolution, so an edit made in the same
+-- second as a fetch would otherwise leave the fingerprint unchanged.
+CREATE TABLE IF NOT EXISTS collection_versions (
+    collection TEXT PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0
+);
+
+INSERT OR IGNORE INTO collection_versions (collection) VALUES ('samples');
+INSERT OR IGNORE INTO collection_versions (collection) VALUES ('studies');
+INSERT OR IGNORE INTO collection_versions (collection) VALUES ('specialists');
+
+-- samples
+CREATE TRIGGER IF NOT EXISTS trg_samples_version_insert AFTER INSERT ON samples
+BEGIN
+    UPDATE collection_versions SET version = version + 1 WHERE collection = 'samples';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_samples_version_update AFTER UPDATE ON samples
+BEGIN
+    UPDATE collection_versions SET version = version + 1 WHERE collection = 'samples';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_samples_version_delete AFTER DELETE ON samples
+BEGIN
+    UPDATE collection_versions SET version = version + 1 WHERE collection = 'samples';
+END;
+
+-- studies
+CREATE TRIGGER IF NOT EXISTS trg_studies_version_insert AFTER INSERT ON studies
+BEGIN
+    UPDATE collection_versions SET version = version + 1 WHERE collection = 'studies';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_studies_version_update AFTER UPDATE ON studies
+BEGIN
+    UPDATE collection_versions SET version = version + 1 WHERE collection = 'studies';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_studies_version_delete AFTER DELETE ON studies
+BEGIN
+    UPDATE collection_versions SET version = version + 1 WHERE collection = 'studies';
+END;
+
+-- specialists (the list joins users with user_roles, so both tables bump it)
+CREATE TRIGGER IF NOT EXISTS trg_users_version_insert AFTER INSERT ON users
+BEGIN
+    UPDATE collection_versions SET version = version + 1 WHERE collection = 'specialists';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_users_version_update AFTER UPDATE ON users
+BEGIN
+    UPDATE collection_versions SET version = version + 1 WHERE collection = 'specialists';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_users_version_delete AFTER DELETE ON users
+BEGIN
+    UPDATE collection_versions SET version = version + 1 WHERE collection = 'specialists';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_user_roles_version_insert AFTER INSERT ON user_roles
+BEGIN
+    UPDATE collection_versions SET version = version + 1 WHERE collection = 'specialists';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_user_roles_version_update AFTER UPDATE ON user_roles
+BEGIN
+    UPDATE collection_versions SET version = version + 1 WHERE collection = 'specialists';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_user_roles_version_delete AFTER DELETE ON user_roles
+BEGIN
+    UPDATE collection_versions SET version = version + 1 WHERE collection = 'specialists';
+END;
+
+-- Insert migration record
+INSERT OR IGNORE INTO migrations (version) VALUES ('009_collection_versions');
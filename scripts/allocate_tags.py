@@ -16,10 +16,12 @@ Usage:
 """
 
 import asyncio
+import heapq
 import sys
 from pathlib import Path
-from itertools import combinations
-from typing import Set, List, Optional, Tuple
+from itertools import combinations, groupby
+from operator import itemgetter
+from typing import Set, List, Optional, Tuple, Iterable
 
 # Add project root to path
 sys.path.insert(0, str(Path(__file__).parent.parent))
@@ -34,88 +36,168 @@ MIN_DISTANCE = 2  # Minimum number of different tags between any two samples
 POSITIONS = ['top-left', 'top-right', 'bottom-left', 'bottom-right']
 
 
-def calculate_distance(set1: Set[int], set2: Set[int]) -> int:
-    """Calculate the number of different tags between two sets."""
-    return len(set1.symmetric_difference(set2)) // 2
+def tags_to_mask(tags: Iterable[int]) -> int:
+    """Pack tag IDs into an int bitmask (bit i is set when tag i is present)."""
+    mask = 0
+    for tag in tags:
+        mask |= 1 << tag
+    return mask
 
 
-def is_valid_allocation(candidate: Set[int], existing: List[Set[int]], min_distance: int = MIN_DISTANCE) -> bool:
-    """Check if a candidate allocation has minimum distance from all existing allocations."""
-    for existing_set in existing:
-        shared = len(candidate & existing_set)
-        # Distance = tags that differ = 4 - shared (for 4-tag sets)
-        # We want at least min_distance different, so shared <= 4 - min_distance
-        if shared > TAGS_PER_SAMPLE - min_distance:
-            return False
-    return True
+def mask_to_tags(mask: int) -> List[int]:
+    """Unpack an allocation bitmask into its sorted tag IDs."""
+    tags = []
+    while mask:
+        low = mask & -mask
+        tags.append(low.bit_length() - 1)
+        mask ^= low
+    return tags
 
 
-def allocate_tags_greedy(existing_allocations: List[Set[int]], count: int = 1) -> List[Set[int]]:
+def calculate_distance(mask1: int, mask2: int) -> int:
+    """Calculate the number of different tags between two allocation masks."""
+    return (mask1 ^ mask2).bit_count() // 2
+
+
+def subset_masks(allocation: int, size: int) -> List[int]:
+    """Masks of every `size`-tag subset of an allocation mask."""
+    bits = [1 << tag for tag in mask_to_tags(allocation)]
+    return [sum(combo) for combo in combinations(bits, size)]
+
+
+def build_blocked_subsets(allocations: Iterable[int], min_distance: int = MIN_DISTANCE) -> Set[int]:
+    """
+    Index the tag subsets that a new allocation must not contain.
+
+    Two 4-tag allocations are too close exactly when they share more than
+    TAGS_PER_SAMPLE - min_distance tags, i.e. when the candidate contains one
+    of the existing allocation's (TAGS_PER_SAMPLE - min_distance + 1)-subsets
+    (its triples, for MIN_DISTANCE = 2). Checking a candidate then costs a
+    few set lookups instead of a scan over every existing allocation.
+    """
+    size = TAGS_PER_SAMPLE - min_distance + 1
+    blocked: Set[int] = set()
+    for alloc in allocations:
+        blocked.update(subset_masks(alloc, size))
+    return blocked
+
+
+def find_first_valid_combination(
+    tags: List[int],
+    blocked: Set[int],
+    min_distance: int = MIN_DISTANCE,
+    size: int = TAGS_PER_SAMPLE
+) -> Optional[int]:
+    """
+    Find the first combination of `size` tags, in itertools.combinations order,
+    that contains none of the `blocked` subsets (see build_blocked_subsets()).
+    Returns its mask.
+
+    Walks i < j < k < l as nested loops over bitmasks. When a tag is added,
+    only the blocked-size subsets that include it are new, so each step checks
+    those few; a prefix that hits a blocked subset is pruned along with all
+    its extensions.
+    """
+    n = len(tags)
+    bits = [1 << tag for tag in tags]
+    max_shared = size - min_distance
+
+    def extend(start: int, prefix: List[int], mask: int) -> Optional[int]:
+        depth = len(prefix)
+        if depth == size:
+            return mask
+        # Prefixes of max_shared tags or fewer can't violate the limit yet
+        partials = [sum(combo) for combo in combinations(prefix, max_shared)] if depth >= max_shared else []
+        for idx in range(start, n - (size - depth) + 1):
+            bit = bits[idx]
+            if any((partial | bit) in blocked for partial in partials):
+                continue
+            prefix.append(bit)
+            found = extend(idx + 1, prefix, mask | bit)
+            prefix.pop()
+            if found is not None:
+                return found
+        return None
+
+    return extend(0, [], 0)
+
+
+def count_tag_usage(allocations: List[int]) -> List[int]:
+    """Count how many allocations use each tag ID."""
+    usage = [0] * TOTAL_TAGS
+    for alloc in allocations:
+        for tag in mask_to_tags(alloc):
+            usage[tag] += 1
+    return usage
+
+
+def allocate_tags_greedy(
+    existing_allocations: List[int],
+    count: int = 1,
+    tag_usage: Optional[List[int]] = None,
+    blocked: Optional[Set[int]] = None
+) -> List[int]:
     """
     Allocate tag sets using a greedy algorithm.
 
+    Allocations (existing and returned) are tag bitmasks; see tags_to_mask().
+    Callers allocating in a loop should keep one mask list and append to it,
+    rather than rebuilding it from sets for every sample. Likewise, passing a
+    tag_usage list from count_tag_usage() and a blocked set from
+    build_blocked_subsets() skips rebuilding them on every call; both are
+    updated in place with the new allocations.
+
     This is faster than exhaustive search but may not find the optimal solution.
     For most practical cases with < 1000 samples, this works well.
     """
     all_tags = list(range(TOTAL_TAGS))
     new_allocations = []
-    all_existing = existing_allocations.copy()
+    subset_size = TAGS_PER_SAMPLE - MIN_DISTANCE + 1
+
+    if tag_usage is None:
+        tag_usage = count_tag_usage(existing_allocations)
+    if blocked is None:
+        blocked = build_blocked_subsets(existing_allocations)
 
     for _ in range(count):
-        # Try to find a valid combination
-        # Start with tags not heavily used
-        tag_usage = {}
-        for alloc in all_existing:
-            for tag in alloc:
-                tag_usage[tag] = tag_usage.get(tag, 0) + 1
-
-        # Sort tags by usage (prefer less used)
-        sorted_tags = sorted(all_tags, key=lambda t: tag_usage.get(t, 0))
-
-        found = False
-        # Try combinations starting with least used tags
-        for combo in combinations(sorted_tags[:100], TAGS_PER_SAMPLE):  # Limit search space
-            candidate = set(combo)
-            if is_valid_allocation(candidate, all_existing):
-                new_allocations.append(candidate)
-                all_existing.append(candidate)
-                found = True
-                break
+        # Try to find a valid combination, starting with the 100 least used tags
+        # (nsmallest is stable, same as sorting by usage and slicing)
+        least_used = heapq.nsmallest(100, all_tags, key=tag_usage.__getitem__)  # Limit search space
+        candidate = find_first_valid_combination(least_used, blocked)
 
-        if not found:
+        if candidate is None:
             # Fallback: try all combinations (slower but guaranteed)
-            for combo in combinations(all_tags, TAGS_PER_SAMPLE):
-                candidate = set(combo)
-                if is_valid_allocation(candidate, all_existing):
-                    new_allocations.append(candidate)
-                    all_existing.append(candidate)
-                    found = True
-                    break
-
-        if not found:
+            candidate = find_first_valid_combination(all_tags, blocked)
+
+        if candidate is None:
+            total = len(existing_allocations) + len(new_allocations)
             raise ValueError(
-                f"Cannot allocate more tags. Maximum capacity reached with {len(all_existing)} samples. "
+                f"Cannot allocate more tags. Maximum capacity reached with {total} samples. "
                 f"Consider using a larger tag family or reducing MIN_DISTANCE."
             )
 
+        new_allocations.append(candidate)
+        blocked.update(subset_masks(candidate, subset_size))
+        for tag in mask_to_tags(candidate):
+            tag_usage[tag] += 1
+
     return new_allocations
 
 
 async def get_existing_allocations(db) -> dict:
     """Get all existing tag allocations from the database."""
     cursor = await db.execute("""
-        SELECT sample_id, GROUP_CONCAT(tag_id) as tags
+        SELECT sample_id, tag_id
         FROM sample_tags
-        GROUP BY sample_id
+        ORDER BY sample_id
     """)
     rows = await cursor.fetchall()
 
-    allocations = {}
-    for row in rows:
-        tags = set(int(t) for t in row['tags'].split(','))
-        allocations[row['sample_id']] = tags
-
-    return allocations
+    # Rows arrive grouped by sample_id; no string building or parsing needed
+    return {
+        sample_id: {row['tag_id'] for row in group}
+        for sample_id, group in groupby(rows, key=itemgetter('sample_id'))
+    }
 
 
 async def get_samples_without_tags(db) -> List[dict]:
@@ -130,14 +212,17 @@ async def get_samples_without_tags(db) -> List[dict]:
     return await cursor.fetchall()
 
 
-async def save_allocation(db, sample_id: int, tags: Set[int]) -> None:
-    """Save a tag allocation to the database."""
-    tag_list = sorted(tags)
-    for i, position in enumerate(POSITIONS):
-        await db.execute("""
-            INSERT INTO sample_tags (sample_id, tag_id, position)
-            VALUES (?, ?, ?)
-        """, (sample_id, tag_list[i], position))
+async def save_allocations(db, allocations: List[Tuple[int, List[int]]]) -> None:
+    """Save (sample_id, tags) allocations to the database in one batch and one commit."""
+    rows = [
+        (sample_id, tag_id, position)
+        for sample_id, tags in allocations
+        for tag_id, position in zip(sorted(tags), POSITIONS)
+    ]
+    await db.executemany("""
+        INSERT INTO sample_tags (sample_id, tag_id, position)
+        VALUES (?, ?, ?)
+    """, rows)
     await db.commit()
 
 
@@ -149,13 +234,10 @@ async def delete_allocation(db, sample_id: int) -> None:
 
 async def allocate_all_samples(dry_run: bool = False, reallocate: bool = False) -> None:
     """Allocate tags to all samples that need them."""
+    # Applies any pending migrations (including 002_sample_tags) exactly once
     await init_db()
 
     async with get_db_context() as db:
-        # Apply migration if needed
-        await db.executescript(open(Path(__file__).parent.parent / "migrations" / "002_sample_tags.sql").read())
-        await db.commit()
-
         if reallocate:
             print("Deleting all existing allocations...")
             await db.execute("DELETE FROM sample_tags")
@@ -173,18 +255,24 @@ async def allocate_all_samples(dry_run: bool = False, reallocate: bool = False)
         print(f"Using MIN_DISTANCE={MIN_DISTANCE} (samples differ by at least {MIN_DISTANCE} tags)")
         print()
 
-        existing_sets = list(existing.values())
+        # Built once and extended as we go, instead of per sample
+        existing_masks = [tags_to_mask(tags) for tags in existing.values()]
+        tag_usage = count_tag_usage(existing_masks)
+        blocked = build_blocked_subsets(existing_masks)
+        new_allocations = []
 
         for sample in samples_needing_tags:
             try:
-                new_tags = allocate_tags_greedy(existing_sets, count=1)[0]
-                existing_sets.append(new_tags)
+                new_mask = allocate_tags_greedy(
+                    existing_masks, count=1, tag_usage=tag_usage, blocked=blocked
+                )[0]
+                existing_masks.append(new_mask)
+                new_tags = mask_to_tags(new_mask)
 
-                tag_str = ", ".join(str(t) for t in sorted(new_tags))
+                tag_str = ", ".join(str(t) for t in new_tags)
                 print(f"Sample {sample['id']:3d} ({sample['drug_name_display']}, Card #{sample['card_id']}): tags [{tag_str}]")
 
-                if not dry_run:
-                    await save_allocation(db, sample['id'], new_tags)
+                new_allocations.append((sample['id'], new_tags))
 
             except ValueError as e:
                 print(f"ERROR: {e}")
@@ -193,7 +281,9 @@ async def allocate_all_samples(dry_run: bool = False, reallocate: bool = False)
         if dry_run:
             print("\n[DRY RUN] No changes were saved to the database.")
         else:
-            print(f"\nSuccessfully allocated tags to {len(samples_needing_tags)} samples.")
+            # Saved in one batch (including any allocated before an error)
+            await save_allocations(db, new_allocations)
+            print(f"\nSuccessfully allocated tags to {len(new_allocations)} samples.")
 
 
 async def allocate_single_sample(sample_id: int, dry_run: bool = False) -> None:
@@ -201,10 +291,6 @@ async def allocate_single_sample(sample_id: int, dry_run: bool = False) -> None:
     await init_db()
 
     async with get_db_context() as db:
-        # Apply migration if needed
-        await db.executescript(open(Path(__file__).parent.parent / "migrations" / "002_sample_tags.sql").read())
-        await db.commit()
-
         # Check if sample exists
         cursor = await db.execute("SELECT * FROM samples WHERE id = ?", (sample_id,))
         sample = await cursor.fetchone()
@@ -221,14 +307,14 @@ async def allocate_single_sample(sample_id: int, dry_run: bool = False) -> None:
             return
 
         existing = await get_existing_allocations(db)
-        existing_sets = list(existing.values())
+        existing_masks = [tags_to_mask(tags) for tags in existing.values()]
 
-        new_tags = allocate_tags_greedy(existing_sets, count=1)[0]
-        tag_str = ", ".join(str(t) for t in sorted(new_tags))
+        new_tags = mask_to_tags(allocate_tags_greedy(existing_masks, count=1)[0])
+        tag_str = ", ".join(str(t) for t in new_tags)
         print(f"Sample {sample_id} ({sample['drug_name_display']}, Card #{sample['card_id']}): tags [{tag_str}]")
 
         if not dry_run:
-            await save_allocation(db, sample_id, new_tags)
+            await save_allocations(db, [(sample_id, new_tags)])
             print("Saved to database.")
         else:
             print("[DRY RUN] Not saved.")
@@ -27,7 +27,7 @@ async def create_admin(email: str, name: str, password: str):
             return False
 
         # Create user
-        password_hash = hash_password(password)
+        password_hash = await hash_password(password)
         user_id = await create_user(
             db,
             email=email,
@@ -54,7 +54,7 @@ async def create_specialist(email: str, name: str, password: str, expertise: str
             print(f"User with email {email} already exists!")
             return False
 
-        password_hash = hash_password(password)
+        password_hash = await hash_password(password)
         user_id = await create_user(
             db,
             email=email,
@@ -7,16 +7,18 @@ Simple FastAPI server that:
 3. Saves audio files to data/audio/
 """
 
-import json
+import asyncio
+import re
 import base64
 from datetime import datetime
 from pathlib import Path
 
+import orjson
 import yaml
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.exceptions import RequestValidationError
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
-from pydantic import BaseModel
+from pydantic import BaseModel, ValidationError
 from typing import Optional, Any
 
 app = FastAPI(title="PAD Salience Annotation Server")
@@ -28,11 +30,68 @@ AUDIO_DIR = DATA_DIR / "audio"
 ANNOTATIONS_FILE = DATA_DIR / "annotations.jsonl"
 CONFIG_FILE = BASE_DIR / "config.yaml"
 
+# Session IDs double as audio filenames, so keep them to a safe character set
+SESSION_ID_PATTERN = re.compile(r"[A-Za-z0-9_-]{1,128}")
+
+# Largest audio body accepted by /api/upload-audio (100 MiB)
+MAX_AUDIO_BYTES = 100 * 1024 * 1024
+
 # Ensure directories exist
 DATA_DIR.mkdir(exist_ok=True)
 AUDIO_DIR.mkdir(exist_ok=True)
 
 
+# In-memory annotation statistics: built from disk on first use, then updated
+# as sessions are saved so neither endpoint has to rescan the JSONL file.
+_stats_cache: Optional[dict] = None
+
+
+def _scan_stats() -> dict:
+    """Compute annotation statistics by reading the JSONL file and audio directory."""
+    stats = {
+        "total_sessions": 0,
+        "total_annotations": 0,
+        "drugs_annotated": set(),
+        "audio_files": 0
+    }
+
+    if ANNOTATIONS_FILE.exists():
+        with open(ANNOTATIONS_FILE, "rb") as f:
+            for line in f:
+                if line.strip():
+                    _add_session_to_stats(stats, orjson.loads(line))
+
+    stats["audio_files"] = len(list(AUDIO_DIR.glob("*.webm")))
+    return stats
+
+
+def _add_session_to_stats(stats: dict, session: dict) -> None:
+    """Count one saved session into the statistics."""
+    stats["total_sessions"] += 1
+    stats["total_annotations"] += len(session.get("annotations", []))
+    if "sample" in session:
+        stats["drugs_annotated"].add(session["sample"].get("drug_name", "unknown"))
+
+
+def get_stats_cache() -> dict:
+    """Return the live statistics, scanning disk the first time."""
+    global _stats_cache
+    if _stats_cache is None:
+        _stats_cache = _scan_stats()
+    return _stats_cache
+
+
+def _append_line(path: Path, line: bytes) -> None:
+    """Append one line to a file (blocking; run in a thread)."""
+    with open(path, "ab") as f:
+        f.write(line + b"\n")
+
+
+def _write_base64(path: Path, data_base64: str) -> None:
+    """Decode base64 data and write it to a file (blocking; run in a thread)."""
+    path.write_bytes(base64.b64decode(data_base64))
+
+
 def load_config():
     """Load configuration from YAML file."""
     if CONFIG_FILE.exists():
@@ -41,9 +100,22 @@ def load_config():
     return {}
 
 
+class CachedStaticFiles(StaticFiles):
+    """StaticFiles that adds a Cache-Control header to every file response."""
+
+    def __init__(self, *args, cache_control: str, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cache_control = cache_control
+
+    def file_response(self, *args, **kwargs):
+        response = super().file_response(*args, **kwargs)
+        response.headers.setdefault("Cache-Control", self.cache_control)
+        return response
+
+
 class AudioData(BaseModel):
     format: str
-    data_base64: str
+    data_base64: Optional[str] = None  # Omitted when uploaded via /api/upload-audio
     duration_ms: Optional[int] = None
 
 
@@ -58,13 +130,54 @@ class AnnotationSession(BaseModel):
     specialist_expertise: Optional[str] = None
 
 
-@app.post("/api/save-annotation")
-async def save_annotation(session: AnnotationSession):
+def _inline_json_schema(model: type[BaseModel]) -> dict:
+    """A model's JSON schema with its $defs inlined (for use in openapi_extra)."""
+    schema = model.model_json_schema()
+    defs = schema.pop("$defs", {})
+
+    def resolve(node):
+        if isinstance(node, dict):
+            if "$ref" in node:
+                return resolve(defs[node["$ref"].rsplit("/", 1)[-1]])
+            return {key: resolve(value) for key, value in node.items()}
+        if isinstance(node, list):
+            return [resolve(value) for value in node]
+        return node
+
+    return resolve(schema)
+
+
+# The body is read and validated by hand, so declare it for the OpenAPI docs
+SAVE_ANNOTATION_OPENAPI = {
+    "requestBody": {
+        "content": {"application/json": {"schema": _inline_json_schema(AnnotationSession)}},
+        "required": True,
+    }
+}
+
+
+@app.post("/api/save-annotation", openapi_extra=SAVE_ANNOTATION_OPENAPI)
+async def save_annotation(request: Request):
     """Save annotation session to JSONL and audio to separate file."""
+    # Validate straight from the raw body in pydantic-core's JSON parser,
+    # rather than json.loads into a dict and then validating that dict
+    try:
+        session = AnnotationSession.model_validate_json(await request.body())
+    except ValidationError as e:
+        # Match FastAPI's own body errors, whose locations start with "body"
+        raise RequestValidationError([
+            {**error, "loc": ("body", *error["loc"])}
+            for error in e.errors(include_url=False)
+        ])
 
     try:
-        # Prepare data for JSONL (without base64 audio data)
-        session_data = session.model_dump()
+        # Load the statistics before appending so this session is counted once
+        stats = get_stats_cache()
+
+        # Prepare data for JSONL (without base64 audio data). The other fields
+        # are plain dicts/lists already, so a shallow dict() avoids model_dump's
+        # recursive copy (and copying the base64 string along with it)
+        session_data = dict(session)
         audio_filename = None
 
         # Save audio file separately if present
@@ -72,10 +185,16 @@ async def save_annotation(session: AnnotationSession):
             audio_filename = f"{session.session_id}.webm"
             audio_path = AUDIO_DIR / audio_filename
 
-            # Decode and save audio
-            audio_bytes = base64.b64decode(session.audio.data_base64)
-            audio_path.write_bytes(audio_bytes)
+            # Decode and save audio (a resubmitted session overwrites its file)
+            is_new_audio = not audio_path.exists()
+            await asyncio.to_thread(_write_base64, audio_path, session.audio.data_base64)
+            if is_new_audio:
+                stats["audio_files"] += 1
+        elif session.audio and (AUDIO_DIR / f"{session.session_id}.webm").exists():
+            # Audio was already uploaded as raw bytes via /api/upload-audio
+            audio_filename = f"{session.session_id}.webm"
 
+        if session.audio:
             # Replace audio data with filename reference
             session_data["audio"] = {
                 "format": session.audio.format,
@@ -83,24 +202,70 @@ async def save_annotation(session: AnnotationSession):
                 "duration_ms": session.audio.duration_ms
             }
 
-        # Append to JSONL
-        with open(ANNOTATIONS_FILE, "a") as f:
-            f.write(json.dumps(session_data) + "\n")
+        # Append to JSONL (off the event loop)
+        await asyncio.to_thread(_append_line, ANNOTATIONS_FILE, orjson.dumps(session_data))
 
-        # Count total annotations
-        total_sessions = sum(1 for _ in open(ANNOTATIONS_FILE)) if ANNOTATIONS_FILE.exists() else 1
+        _add_session_to_stats(stats, session_data)
 
         return {
             "status": "success",
             "session_id": session.session_id,
             "audio_saved": audio_filename is not None,
-            "total_sessions": total_sessions
+            "total_sessions": stats["total_sessions"]
         }
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+async def _stream_to_file(request: Request, path: Path, limit: int) -> int:
+    """Stream a request body to a file, writing each chunk in a worker thread."""
+    f = await asyncio.to_thread(open, path, "wb")
+    size = 0
+    try:
+        async for chunk in request.stream():
+            size += len(chunk)
+            if size > limit:
+                raise HTTPException(status_code=413, detail="Audio upload too large")
+            await asyncio.to_thread(f.write, chunk)
+    finally:
+        await asyncio.to_thread(f.close)
+    return size
+
+
+@app.post("/api/upload-audio/{session_id}")
+async def upload_audio(session_id: str, request: Request):
+    """Save a session's audio from a raw request body (no base64), streamed to disk."""
+    if not SESSION_ID_PATTERN.fullmatch(session_id):
+        raise HTTPException(status_code=400, detail="Invalid session id")
+
+    # Reject oversized uploads up front when the client declares a length;
+    # _stream_to_file enforces the same limit on the bytes actually received
+    content_length = request.headers.get("content-length", "")
+    if content_length.isdigit() and int(content_length) > MAX_AUDIO_BYTES:
+        raise HTTPException(status_code=413, detail="Audio upload too large")
+
+    stats = get_stats_cache()
+    audio_path = AUDIO_DIR / f"{session_id}.webm"
+    tmp_path = audio_path.with_suffix(".webm.part")
+    is_new_audio = not await asyncio.to_thread(audio_path.exists)
+
+    try:
+        size = await _stream_to_file(request, tmp_path, MAX_AUDIO_BYTES)
+        await asyncio.to_thread(tmp_path.replace, audio_path)
+    except HTTPException:
+        await asyncio.to_thread(tmp_path.unlink, missing_ok=True)
+        raise
+    except Exception as e:
+        await asyncio.to_thread(tmp_path.unlink, missing_ok=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+    if is_new_audio:
+        stats["audio_files"] += 1
+
+    return {"status": "success", "session_id": session_id, "bytes": size}
+
+
 @app.get("/api/config")
 async def get_config():
     """Get application configuration."""
@@ -110,40 +275,29 @@ async def get_config():
 @app.get("/api/stats")
 async def get_stats():
     """Get annotation statistics."""
-
-    stats = {
-        "total_sessions": 0,
-        "total_annotations": 0,
-        "drugs_annotated": set(),
-        "audio_files": 0
-    }
-
-    if ANNOTATIONS_FILE.exists():
-        with open(ANNOTATIONS_FILE) as f:
-            for line in f:
-                if line.strip():
-                    session = json.loads(line)
-                    stats["total_sessions"] += 1
-                    stats["total_annotations"] += len(session.get("annotations", []))
-                    if "sample" in session:
-                        stats["drugs_annotated"].add(session["sample"].get("drug_name", "unknown"))
-
-    stats["drugs_annotated"] = list(stats["drugs_annotated"])
-    stats["audio_files"] = len(list(AUDIO_DIR.glob("*.webm")))
-
-    return stats
+    stats = get_stats_cache()
+    return {**stats, "drugs_annotated": list(stats["drugs_annotated"])}
 
 
 # Serve static files
+# Assets (AprilTag images) rarely change, so browsers may reuse them for a day;
+# the prototype page is always revalidated, which its ETag turns into a 304
+prototype_files = CachedStaticFiles(directory=BASE_DIR / "prototype", html=True, cache_control="no-cache")
+
 app.mount("/sample_images", StaticFiles(directory=BASE_DIR / "sample_images"), name="sample_images")
-app.mount("/assets", StaticFiles(directory=BASE_DIR / "assets"), name="assets")
-app.mount("/prototype", StaticFiles(directory=BASE_DIR / "prototype", html=True), name="prototype")
+app.mount(
+    "/assets",
+    CachedStaticFiles(directory=BASE_DIR / "assets", cache_control="public, max-age=86400"),
+    name="assets"
+)
+app.mount("/prototype", prototype_files, name="prototype")
 
 
 @app.get("/")
-async def root():
+async def root(request: Request):
     """Serve annotation prototype."""
-    return FileResponse(BASE_DIR / "prototype" / "index.html")
+    # Go through the prototype mount so "/" gets the same headers and 304s
+    return await prototype_files.get_response("index.html", request.scope)
 
 
 if __name__ == "__main__":